@@ -0,0 +1,385 @@
+"""
+批量分配引擎
+申请提交时已完成抽签（见 Application.draw_lottery），夜间分配只需按时间段读取抽签键最小的前k个候选人，
+使用NumPy按列确定每个时间段的中签者，再以批量语句写回申请状态、候补位置、预约记录和各项统计计数
+每个时间段至多k个候选人，排序只是对已取出的少量数据做一次lexsort，在当前进程中执行；
+曾经按日期和场地分片交给进程池并行排序，但启动子进程和传递数组的开销始终大于排序本身，已移除
+写回按时间段分块提交并记录检查点，单个时间段写入失败只影响该时间段，中断的分配下次从检查点继续
+"""
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import bindparam, func, select
+from models import db, Application, Reservation, TimeSlot, Student, ApplicationStatus, AllocationRun, MIN_PRIORITY_WEIGHT
+from priority import refresh_pending_weights
+from changes import slots_changed
+import quota
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def minutes(value):
+    """时间转换为当天的分钟数"""
+    return value.hour * 60 + value.minute if value else 0
+
+
+def backfill_lottery_keys(max_app_id, rng):
+    """为升级前提交、尚未抽签的待处理申请按学生当前权重补充抽签键，返回补充数量"""
+    rows = db.session.query(Application.id, Student.priority_weight).join(
+        Student, Application.student_id == Student.id
+    ).filter(
+        Application.status == ApplicationStatus.PENDING,
+        Application.lottery_key.is_(None),
+        Application.id <= max_app_id
+    ).all()
+    if not rows:
+        return 0
+
+    weights = np.array([weight or 0.0 for _, weight in rows], dtype=np.float64)
+    tickets = rng.exponential(size=len(rows))
+    keys = tickets / np.maximum(weights, MIN_PRIORITY_WEIGHT)
+
+    applications = Application.__table__
+    db.session.execute(
+        applications.update().where(
+            applications.c.id == bindparam('b_id')
+        ).values(
+            priority_weight=bindparam('b_weight'),
+            lottery_ticket=bindparam('b_ticket'),
+            lottery_key=bindparam('b_key')
+        ),
+        [{'b_id': app_id, 'b_weight': weight, 'b_ticket': ticket, 'b_key': key}
+         for (app_id, _), weight, ticket, key in zip(rows, weights.tolist(), tickets.tolist(), keys.tolist())]
+    )
+    return len(rows)
+
+
+def load_candidates(max_app_id, top_k, after_slot_id=0):
+    """
+    读取每个时间段抽签键最小的前top_k个待处理申请及其时间段信息，返回按列组织的数组
+    after_slot_id: 只读取ID大于该值的时间段（从检查点继续时使用）
+    排名由数据库沿 (time_slot_id, status, lottery_key) 索引完成，Python只处理 O(时间段数×k) 行
+    """
+    applications = Application.__table__
+    ranked = select(
+        applications.c.id,
+        applications.c.student_id,
+        applications.c.time_slot_id,
+        applications.c.lottery_key,
+        func.row_number().over(
+            partition_by=applications.c.time_slot_id,
+            order_by=(applications.c.lottery_key, applications.c.id)
+        ).label('rank')
+    ).where(
+        applications.c.status == ApplicationStatus.PENDING,
+        applications.c.id <= max_app_id,
+        applications.c.time_slot_id > after_slot_id
+    ).subquery()
+
+    rows = db.session.query(
+        ranked.c.id,
+        ranked.c.student_id,
+        ranked.c.time_slot_id,
+        ranked.c.lottery_key,
+        TimeSlot.is_available,
+        TimeSlot.court_id,
+        TimeSlot.date,
+        TimeSlot.start_time,
+        TimeSlot.end_time
+    ).outerjoin(
+        TimeSlot, ranked.c.time_slot_id == TimeSlot.id
+    ).filter(
+        ranked.c.rank <= top_k
+    ).all()
+
+    count = len(rows)
+    pending = {
+        'app_id': np.fromiter((r[0] for r in rows), dtype=np.int64, count=count),
+        'student_id': np.fromiter((r[1] for r in rows), dtype=np.int64, count=count),
+        'slot_id': np.fromiter((r[2] for r in rows), dtype=np.int64, count=count),
+        'key': np.fromiter((r[3] for r in rows), dtype=np.float64, count=count),
+        # 时间段不存在（外连接为空）或不可用时，该时间段的申请全部拒绝
+        'available': np.fromiter((bool(r[4]) for r in rows), dtype=bool, count=count),
+        # 冲突检测所需的时间段信息，日期存为序数、时间存为分钟数
+        'court_id': np.fromiter((r[5] or 0 for r in rows), dtype=np.int64, count=count),
+        'day': np.fromiter((r[6].toordinal() if r[6] else 0 for r in rows), dtype=np.int64, count=count),
+        'start_minute': np.fromiter((minutes(r[7]) for r in rows), dtype=np.int64, count=count),
+        'end_minute': np.fromiter((minutes(r[8]) for r in rows), dtype=np.int64, count=count),
+    }
+    # 每个候选人所属学生本周剩余的预约次数，限制其中签数
+    left = quota.remaining(np.unique(pending['student_id']).tolist())
+    pending['remaining'] = np.fromiter((left[s] for s in pending['student_id'].tolist()), dtype=np.int64, count=count)
+    return pending
+
+
+def group_starts(sorted_keys):
+    """返回已排序数组中每组第一个元素的下标"""
+    if len(sorted_keys) == 0:
+        return np.empty(0, dtype=np.int64)
+    change = np.empty(len(sorted_keys), dtype=bool)
+    change[0] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=change[1:])
+    return np.flatnonzero(change)
+
+
+def rank_candidates(slot_ids, keys):
+    """按时间段、抽签键升序排列，返回排序下标"""
+    return np.lexsort((keys, slot_ids))
+
+
+def rank_all(pending, candidates):
+    """
+    对所有候选申请排序，返回候选申请的全局下标
+    同一时间段的申请连续排列且按抽签键升序
+    """
+    return candidates[rank_candidates(pending['slot_id'][candidates], pending['key'][candidates])]
+
+
+def resolve_conflicts(pending, ordered):
+    """
+    处理学生冲突：同一学生中签的时间段按抽签键依次保留，
+    与已保留的时间段同一天且时间重叠、或保留数已达该学生本周剩余预约次数的，
+    顺延给该时间段的下一位候选人，直到没有冲突
+    返回最终中签申请的下标
+    """
+    starts = group_starts(pending['slot_id'][ordered])
+    ends = np.append(starts[1:], len(ordered))
+    pointer = starts.copy()
+    active = np.ones(len(starts), dtype=bool)
+
+    student = pending['student_id']
+    day = pending['day']
+    begin = pending['start_minute']
+    finish = pending['end_minute']
+    keys = pending['key']
+    remaining = pending['remaining']
+
+    while True:
+        groups = np.flatnonzero(active)
+        winners = ordered[pointer[groups]]
+
+        # 按(学生, 抽签键)排序，只检查中签多个时间段或中签数超过剩余次数的学生
+        order = np.lexsort((keys[winners], student[winners]))
+        winners, groups = winners[order], groups[order]
+        student_starts = group_starts(student[winners])
+        student_sizes = np.diff(np.append(student_starts, len(winners)))
+        checked = (student_sizes > 1) | (remaining[winners[student_starts]] < student_sizes)
+
+        losers = []
+        for first, size in zip(student_starts[checked], student_sizes[checked]):
+            kept = []
+            limit = remaining[winners[first]]
+            for i in range(first, first + size):
+                w = winners[i]
+                if len(kept) >= limit or any(
+                    day[w] == day[k] and begin[w] < finish[k] and begin[k] < finish[w] for k in kept
+                ):
+                    losers.append(groups[i])
+                else:
+                    kept.append(w)
+
+        if not losers:
+            return winners
+
+        # 冲突时间段顺延给下一位候选人，前k个候选人用尽则该时间段本次无人中签
+        losers = np.array(losers)
+        pointer[losers] += 1
+        active[losers[pointer[losers] >= ends[losers]]] = False
+
+
+def compute_allocation(pending):
+    """根据候选人数据计算中签者，不访问数据库；不可用时间段的申请不参与抽签"""
+    candidates = np.flatnonzero(pending['available'])
+    ordered = rank_all(pending, candidates)
+    return resolve_conflicts(pending, ordered) if len(ordered) else ordered
+
+
+def write_slots(pending, winners, slot_ids, max_app_id, now):
+    """以批量语句写回一组时间段的分配结果（不提交事务），返回被拒绝的申请数"""
+    app_ids = pending['app_id']
+    student_ids = pending['student_id']
+    applications = Application.__table__
+    snapshot = [
+        applications.c.status == ApplicationStatus.PENDING,
+        applications.c.id <= max_app_id,
+        applications.c.time_slot_id.in_(slot_ids)
+    ]
+    slots_changed(slot_ids)
+
+    # 中签申请
+    if len(winners) > 0:
+        db.session.execute(
+            applications.update().where(
+                applications.c.id.in_(app_ids[winners].tolist())
+            ).values(status=ApplicationStatus.APPROVED, processed_at=now)
+        )
+
+    # 不可用时间段的申请直接拒绝，不进入候补
+    in_chunk = np.isin(pending['slot_id'], slot_ids)
+    unavailable = np.unique(pending['slot_id'][in_chunk & ~pending['available']]).tolist()
+    rejected = 0
+    if unavailable:
+        rejected += db.session.execute(
+            applications.update().where(
+                applications.c.time_slot_id.in_(unavailable), *snapshot
+            ).values(status=ApplicationStatus.REJECTED, processed_at=now)
+        ).rowcount
+
+    # 其余申请按抽签键顺序写入候补位置，再统一拒绝；加载之后新提交的申请保持待处理
+    ranked = select(
+        applications.c.id,
+        func.row_number().over(
+            partition_by=applications.c.time_slot_id,
+            order_by=(applications.c.lottery_key, applications.c.id)
+        ).label('position')
+    ).where(*snapshot).subquery()
+    db.session.execute(
+        applications.update().where(
+            applications.c.id == ranked.c.id
+        ).values(queue_position=ranked.c.position)
+    )
+    rejected += db.session.execute(
+        applications.update().where(*snapshot).values(
+            status=ApplicationStatus.REJECTED, processed_at=now
+        )
+    ).rowcount
+
+    if len(winners) == 0:
+        return rejected
+
+    # 创建预约记录
+    winner_slots = pending['slot_id'][winners].tolist()
+    db.session.bulk_insert_mappings(Reservation, [
+        {'student_id': student_id, 'time_slot_id': slot_id,
+         'application_id': app_id, 'created_at': now}
+        for student_id, slot_id, app_id in zip(
+            student_ids[winners].tolist(), winner_slots, app_ids[winners].tolist()
+        )
+    ])
+
+    # 更新时间段状态
+    time_slots = TimeSlot.__table__
+    db.session.execute(
+        time_slots.update().where(time_slots.c.id.in_(winner_slots)).values(is_available=False)
+    )
+
+    # 更新学生成功次数与周统计，同一学生多次中签时合并为一条语句参数
+    winner_students, win_counts = np.unique(student_ids[winners], return_counts=True)
+    students = Student.__table__
+    db.session.execute(
+        students.update().where(
+            students.c.id == bindparam('b_id')
+        ).values(
+            successful_applications=func.coalesce(students.c.successful_applications, 0) + bindparam('b_count')
+        ),
+        [{'b_id': s, 'b_count': n} for s, n in zip(winner_students.tolist(), win_counts.tolist())]
+    )
+    quota.add(dict(zip(winner_students.tolist(), win_counts.tolist())))
+
+    # 成功次数变化后权重随之变化，同步中签学生其余待处理申请的抽签键
+    refresh_pending_weights(winner_students.tolist())
+
+    return rejected
+
+
+def write_chunk(run, pending, winner_of_slot, slot_ids, now):
+    """
+    提交一个分块：先整体批量写入；失败时回滚，改为逐个时间段在保存点中写入，
+    出错的时间段跳过并保持待处理，留待下次分配
+    """
+    def winners_of(slots):
+        return np.array([winner_of_slot[s] for s in slots if s in winner_of_slot], dtype=np.int64)
+
+    try:
+        rejected = write_slots(pending, winners_of(slot_ids), slot_ids, run.max_application_id, now)
+        run.allocated_count += len(winners_of(slot_ids))
+        run.rejected_count += rejected
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"分块写入失败，改为逐个时间段写入: {str(e)}")
+        for slot_id in slot_ids:
+            try:
+                with db.session.begin_nested():
+                    rejected = write_slots(pending, winners_of([slot_id]), [slot_id], run.max_application_id, now)
+                run.allocated_count += len(winners_of([slot_id]))
+                run.rejected_count += rejected
+            except Exception as e:
+                run.failed_slots += 1
+                logger.error(f"时间段 {slot_id} 分配写入失败，已跳过: {str(e)}")
+
+    run.last_slot_id = slot_ids[-1]
+    run.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def start_or_resume_run():
+    """
+    返回 (分配记录, 是否为继续上次未完成的记录)：有未完成的记录时返回该记录；
+    没有则以当前最大待处理申请ID为快照创建新记录，无待处理申请时返回 (None, False)
+    """
+    run = AllocationRun.query.filter_by(status='running').order_by(AllocationRun.id.desc()).first()
+    if run:
+        logger.info(f"从检查点继续分配: 记录 {run.id}，已完成至时间段 {run.last_slot_id}")
+        return run, True
+
+    # 以当前最大申请ID为快照，之后提交的申请留到下一次分配
+    max_app_id = db.session.query(func.max(Application.id)).filter(
+        Application.status == ApplicationStatus.PENDING
+    ).scalar()
+    if max_app_id is None:
+        return None, False
+
+    run = AllocationRun(
+        max_application_id=max_app_id, last_slot_id=0,
+        allocated_count=0, rejected_count=0, failed_slots=0
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run, False
+
+
+def execute_run(run, rng, now, top_k, chunk_size):
+    """从检查点开始执行一条分配记录直至完成"""
+    if backfill_lottery_keys(run.max_application_id, rng):
+        db.session.commit()
+
+    pending = load_candidates(run.max_application_id, top_k, run.last_slot_id)
+    winners = compute_allocation(pending)
+
+    winner_of_slot = dict(zip(pending['slot_id'][winners].tolist(), winners.tolist()))
+    slot_ids = np.unique(pending['slot_id']).tolist()
+    for i in range(0, len(slot_ids), chunk_size):
+        write_chunk(run, pending, winner_of_slot, slot_ids[i:i + chunk_size], now)
+
+    run.status = 'completed'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_allocation(rng=None, now=None, top_k=None, chunk_size=None):
+    """
+    执行批量分配，按时间段分块提交
+    先完成上次中断的分配记录；继续的记录只包含其快照内的申请，完成后再以当前最大待处理申请ID为快照
+    开始新的分配，直到某次分配不是继续旧记录为止，之后提交的申请不会因旧记录而一直得不到处理
+    rng: numpy随机数生成器，仅用于补充旧申请的抽签键；now: 处理时间
+    top_k: 每个时间段读取的候选人数，默认读取配置ALLOCATION_TOP_K
+    chunk_size: 每次提交的时间段数，默认读取配置ALLOCATION_CHUNK_SIZE
+    返回本次完成的分配记录列表，无待处理申请时为空列表
+    """
+    config = current_app.config
+    rng = rng if rng is not None else np.random.default_rng()
+    now = now or datetime.utcnow()
+    top_k = config.get('ALLOCATION_TOP_K', 5) if top_k is None else top_k
+    chunk_size = config.get('ALLOCATION_CHUNK_SIZE', 200) if chunk_size is None else chunk_size
+
+    runs = []
+    resumed = True
+    while resumed:
+        run, resumed = start_or_resume_run()
+        if run is None:
+            break
+        execute_run(run, rng, now, top_k, chunk_size)
+        runs.append(run)
+    return runs
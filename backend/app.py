@@ -3,17 +3,23 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
 from models import db
+from migrations import upgrade_schema
+from board import backfill_board
+import events
+import court_registry
+import template_registry
 from routes.student_routes import student_bp
 from routes.court_routes import court_bp
 from scheduler import init_scheduler
 import os
 
-def create_app():
+def create_app(start_scheduler=True):
     app = Flask(__name__)
     app.config.from_object(Config)
     
     # 初始化扩展
     db.init_app(app)
+    events.configure(app.config['EVENT_BUFFER_SIZE'])
     CORS(app)
     jwt = JWTManager(app)
     
@@ -21,9 +27,10 @@ def create_app():
     app.register_blueprint(student_bp, url_prefix='/api/student')
     app.register_blueprint(court_bp, url_prefix='/api')
     
-    # 创建数据库表
+    # 创建数据库表，并为已有数据库补齐新增的列和索引
     with app.app_context():
         db.create_all()
+        upgrade_schema(db)
         # 初始化一些基础数据
         from models import Court, TimeSlot
         if Court.query.count() == 0:
@@ -37,9 +44,18 @@ def create_app():
             for court in courts:
                 db.session.add(court)
             db.session.commit()
+        
+        # 加载场地注册表和场次模板注册表
+        court_registry.reload()
+        template_registry.reload()
+        
+        # 为尚无看板行的时间段（如旧数据库或脚本直接写入的时间段）生成看板
+        backfill_board()
+        db.session.commit()
     
-    # 初始化调度器
-    init_scheduler(app)
+    # 初始化调度器（基准测试等离线脚本可关闭）
+    if start_scheduler:
+        init_scheduler(app)
     
     return app
 
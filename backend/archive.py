@@ -0,0 +1,109 @@
+"""
+过期数据归档
+将超过保留期的取消事件、预约和申请按主键分批移出热表，
+以gzip压缩的JSON Lines按表、按月追加写入归档目录（ARCHIVE_DIR/<表名>/<YYYY-MM>.jsonl.gz）。
+每批单独提交，批次之间休眠，写锁只在一批的删除期间持有，在线请求可以穿插执行。
+先写归档文件再删除并提交，中途中断时下次运行可能重复归档同一批数据，但不会丢失
+"""
+
+import os
+import gzip
+import json
+import time
+import enum
+from datetime import datetime, date, time as dt_time, timedelta
+from flask import current_app
+from sqlalchemy import select, exists
+from models import db, Application, Reservation, CancellationEvent
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def archive_dir():
+    """归档目录，未配置时使用实例目录下的archive"""
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def to_json(value):
+    """JSON序列化日期时间和枚举字段"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def write_archive(table, rows, timestamp_column):
+    """把一批数据行按月份追加写入归档文件"""
+    by_month = {}
+    for row in rows:
+        stamp = row[timestamp_column]
+        month = stamp.strftime('%Y-%m') if stamp else 'unknown'
+        by_month.setdefault(month, []).append(row)
+
+    directory = os.path.join(archive_dir(), table.name)
+    os.makedirs(directory, exist_ok=True)
+    for month, month_rows in by_month.items():
+        # 追加模式会生成多段gzip，标准gzip读取工具可以连续读出
+        with gzip.open(os.path.join(directory, f'{month}.jsonl.gz'), 'at', encoding='utf-8') as f:
+            for row in month_rows:
+                f.write(json.dumps(dict(row), ensure_ascii=False, default=to_json) + '\n')
+
+
+def archive_table(table, timestamp_column, conditions, batch_size, pause):
+    """按主键顺序分批归档满足条件的数据行，返回归档行数"""
+    archived = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table).where(table.c.id > last_id, *conditions).order_by(table.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+
+        ids = [row['id'] for row in rows]
+        write_archive(table, rows, timestamp_column)
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+
+        archived += len(ids)
+        last_id = ids[-1]
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause)
+
+    return archived
+
+
+def archive_old_data(now=None):
+    """归档超过保留期的数据，返回各表归档行数"""
+    config = current_app.config
+    cutoff = (now or datetime.utcnow()) - timedelta(days=config['ARCHIVE_RETENTION_DAYS'])
+    batch_size = config['ARCHIVE_BATCH_SIZE']
+    pause = config['ARCHIVE_BATCH_PAUSE']
+
+    events = CancellationEvent.__table__
+    reservations = Reservation.__table__
+    applications = Application.__table__
+
+    counts = {}
+    # 按引用关系从外到内归档：已处理的取消事件 -> 预约 -> 申请
+    counts['cancellation_events'] = archive_table(events, 'created_at', [
+        events.c.created_at < cutoff,
+        events.c.processed_at.isnot(None)
+    ], batch_size, pause)
+
+    # 仍被未处理取消事件引用的预约暂不归档
+    counts['reservations'] = archive_table(reservations, 'created_at', [
+        reservations.c.created_at < cutoff,
+        ~exists().where(events.c.reservation_id == reservations.c.id)
+    ], batch_size, pause)
+
+    # 仍被预约记录引用的申请暂不归档，等对应预约归档后再处理
+    counts['applications'] = archive_table(applications, 'applied_at', [
+        applications.c.applied_at < cutoff,
+        ~exists().where(reservations.c.application_id == applications.c.id)
+    ], batch_size, pause)
+
+    return counts
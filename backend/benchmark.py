@@ -0,0 +1,726 @@
+#!/usr/bin/env python3
+"""
+FairCourt 调度任务基准测试脚本
+在临时SQLite数据库中按随机种子生成可复现的模拟数据，
+依次运行各调度任务，统计每个阶段的耗时、SQL语句数和内存峰值，并保存为JSON；
+同时执行若干性能检查项，任一检查失败时以非零状态退出
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+from datetime import datetime, date, time as dt_time, timedelta
+
+DEFAULT_DB_PATH = '/tmp/faircourt_benchmark.db'
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='FairCourt 调度任务基准测试')
+    parser.add_argument('--students', type=int, default=5000, help='学生人数')
+    parser.add_argument('--courts', type=int, default=8, help='场地数量')
+    parser.add_argument('--days', type=int, default=7, help='生成时间段的天数')
+    parser.add_argument('--slots-per-day', type=int, default=8, help='每个场地每天的时间段数')
+    parser.add_argument('--applications', type=int, default=100000, help='待处理申请数量')
+    parser.add_argument('--distribution', choices=['uniform', 'zipf'], default='zipf',
+                        help='申请在时间段上的分布，zipf表示热门时间段集中')
+    parser.add_argument('--zipf-a', type=float, default=1.3, help='zipf分布参数，越大越集中')
+    parser.add_argument('--no-show-rate', type=float, default=0.2, help='昨日预约的爽约比例')
+    parser.add_argument('--cancellations', type=int, default=500, help='分配后取消的预约数量')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--clients', type=int, default=64, help='并发预约检查的并行客户端数')
+    parser.add_argument('--contested-slots', type=int, default=16, help='并发预约检查中被争抢的时间段数')
+    parser.add_argument('--logins', type=int, default=128, help='登录吞吐测试的登录请求总数')
+    parser.add_argument('--login-clients', type=int, default=32, help='登录吞吐测试的并行客户端数（每个客户端一个学生）')
+    parser.add_argument('--bcrypt-rounds', type=int, default=10, help='登录吞吐测试使用的bcrypt工作因子（BCRYPT_ROUNDS）')
+    parser.add_argument('--template-slots', type=int, default=100000, help='按场次模板生成的时间段数量')
+    parser.add_argument('--import-slots', type=int, default=5000, help='导入接口一次提交的时间段数量')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='临时数据库文件路径（会被覆盖）')
+    parser.add_argument('--output', help='结果JSON文件路径')
+    parser.add_argument('--compare', help='与之前保存的结果JSON对比')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='不统计内存峰值（tracemalloc会拖慢执行，关闭后耗时更准确）')
+    return parser.parse_args(argv)
+
+
+def create_benchmark_app(db_path):
+    """在临时数据库上创建应用（不启动调度器）"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(db_path)}'
+
+    from app import create_app
+    return create_app(start_scheduler=False)
+
+
+class StatementCounter:
+    """统计引擎上执行的SQL语句数"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self.rows = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.rows += len(parameters) if executemany else 1
+
+
+class QueryRecorder:
+    """记录执行过的SQL语句（去重），用于检查查询计划"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.active = False
+        self.statements = {}
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany and not statement.lstrip().upper().startswith(('EXPLAIN', 'PRAGMA')):
+            self.statements.setdefault(statement, parameters)
+
+
+def measure(name, func, counter, trace_memory=True):
+    """运行一个阶段并记录耗时、SQL语句数与内存峰值"""
+    start_count, start_rows = counter.count, counter.rows
+    if trace_memory:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        'phase': name,
+        'wall_time': round(elapsed, 4),
+        'sql_statements': counter.count - start_count,
+        'sql_parameter_sets': counter.rows - start_rows,
+        'peak_memory_bytes': peak,
+    }
+    memory = f"{peak / 1024 / 1024:.1f} MB" if peak is not None else '-'
+    print(f"  {name:<28} {elapsed:>8.3f}s  {result['sql_statements']:>7} 条SQL  内存峰值 {memory}")
+    return result
+
+
+def populate(args):
+    """生成模拟数据：学生、场地、时间段、待处理申请及昨日预约"""
+    import numpy as np
+    import bcrypt
+    from models import db, Court, TimeSlot, Student, Application, Reservation, ApplicationStatus, MIN_PRIORITY_WEIGHT
+    from board import backfill_board
+    import court_registry
+
+    rng = np.random.default_rng(args.seed)
+
+    # 所有学生共用一个密码哈希，避免生成数据时耗费大量时间在bcrypt上
+    password_hash = bcrypt.hashpw(b'password123', bcrypt.gensalt(4)).decode('utf-8')
+    totals = rng.integers(0, 40, size=args.students)
+    successes = (totals * rng.random(args.students)).astype(int)
+    credits = rng.choice([60, 80, 90, 100], size=args.students, p=[0.05, 0.1, 0.15, 0.7])
+    db.session.bulk_insert_mappings(Student, [
+        {'student_id': f'B{i:07d}', 'name': f'学生{i}', 'email': f'b{i}@bench.local',
+         'password_hash': password_hash, 'credit_score': int(credits[i]),
+         'total_applications': int(totals[i]), 'successful_applications': int(successes[i]),
+         'no_show_count': 0}
+        for i in range(args.students)
+    ])
+
+    existing_courts = Court.query.count()
+    db.session.bulk_insert_mappings(Court, [
+        {'name': f'基准场地{i + 1}号', 'location': '基准测试馆', 'capacity': 2}
+        for i in range(existing_courts, args.courts)
+    ])
+    db.session.commit()
+    # 批量写入不触发ORM事件，手动重新加载场地注册表
+    court_registry.reload()
+
+    court_ids = [court_id for (court_id,) in db.session.query(Court.id).order_by(Court.id).limit(args.courts)]
+    student_ids = np.array([s for (s,) in db.session.query(Student.id).order_by(Student.id)])
+
+    # 未来K天的时间段，以及昨天用于信用评分的时间段
+    hours = [8 + h for h in range(args.slots_per_day)]
+    days = [date.today() - timedelta(days=1)] + [date.today() + timedelta(days=d + 1) for d in range(args.days)]
+    db.session.bulk_insert_mappings(TimeSlot, [
+        {'court_id': court_id, 'date': day, 'start_time': dt_time(hour % 24),
+         'end_time': dt_time((hour + 1) % 24) if hour < 23 else dt_time(23, 59)}
+        for day in days for court_id in court_ids for hour in hours
+    ])
+    db.session.commit()
+
+    yesterday = days[0]
+    past_slots = [s for (s,) in db.session.query(TimeSlot.id).filter(TimeSlot.date == yesterday).order_by(TimeSlot.id)]
+    future_slots = np.array([s for (s,) in db.session.query(TimeSlot.id).filter(TimeSlot.date > yesterday).order_by(TimeSlot.id)])
+
+    # 昨日预约：一部分已完成，其余在信用评分阶段被判定为爽约
+    reserved_students = rng.choice(student_ids, size=len(past_slots))
+    completed = rng.random(len(past_slots)) >= args.no_show_rate
+    db.session.bulk_insert_mappings(Reservation, [
+        {'student_id': int(student_id), 'time_slot_id': slot_id, 'is_completed': bool(done)}
+        for slot_id, student_id, done in zip(past_slots, reserved_students, completed)
+    ])
+    db.session.bulk_update_mappings(TimeSlot, [{'id': s, 'is_available': False} for s in past_slots])
+
+    # 待处理申请：按分布抽取时间段，同一学生对同一时间段只保留一条
+    if args.distribution == 'zipf':
+        ranks = (rng.zipf(args.zipf_a, size=args.applications) - 1) % len(future_slots)
+        slot_choices = future_slots[rng.permutation(len(future_slots))][ranks]
+    else:
+        slot_choices = rng.choice(future_slots, size=args.applications)
+    pairs = set(zip(rng.choice(student_ids, size=args.applications).tolist(), slot_choices.tolist()))
+    # 少数学生每天各申请一个时间段且抽签键极小，不受配额限制时会全部中签，用于检查分配是否遵守周配额
+    per_day = len(court_ids) * len(hours)
+    slots_by_day = [future_slots[d * per_day:(d + 1) * per_day] for d in range(args.days)]
+    greedy = {
+        (int(student_id), int(day_slots[k % len(day_slots)])): 1e-9
+        for k, student_id in enumerate(rng.choice(student_ids, size=min(10, len(student_ids)), replace=False))
+        for day_slots in slots_by_day
+    }
+    pairs -= set(greedy)
+    # 与提交申请时相同，生成数据时即完成抽签
+    weights = rng.random(len(pairs))
+    tickets = rng.exponential(size=len(pairs))
+    keys = tickets / np.maximum(weights, MIN_PRIORITY_WEIGHT)
+    db.session.bulk_insert_mappings(Application, [
+        {'student_id': student_id, 'time_slot_id': slot_id, 'status': ApplicationStatus.PENDING,
+         'priority_weight': weight, 'lottery_ticket': ticket, 'lottery_key': key}
+        for (student_id, slot_id), weight, ticket, key in zip(
+            sorted(pairs), weights.tolist(), tickets.tolist(), keys.tolist()
+        )
+    ] + [
+        {'student_id': student_id, 'time_slot_id': slot_id, 'status': ApplicationStatus.PENDING,
+         'priority_weight': 1.0, 'lottery_ticket': key, 'lottery_key': key}
+        for (student_id, slot_id), key in greedy.items()
+    ])
+    # 直接写入的数据没有经过写接口，与启动时相同统一生成时间段看板
+    backfill_board()
+    db.session.commit()
+
+
+def cancel_reservations(args):
+    """分配完成后随机取消一部分预约，为候补队列阶段准备数据"""
+    import numpy as np
+    from models import db, Reservation, TimeSlot, CancellationEvent
+
+    rng = np.random.default_rng(args.seed + 1)
+    reservation_ids = [r for (r,) in db.session.query(Reservation.id).join(
+        TimeSlot, Reservation.time_slot_id == TimeSlot.id
+    ).filter(
+        TimeSlot.date > date.today(),
+        Reservation.is_cancelled == False
+    ).order_by(Reservation.id)]
+    if not reservation_ids:
+        return
+
+    chosen = sorted(rng.choice(reservation_ids, size=min(args.cancellations, len(reservation_ids)), replace=False).tolist())
+    now = datetime.utcnow()
+    db.session.bulk_update_mappings(Reservation, [
+        {'id': r, 'is_cancelled': True, 'cancelled_at': now} for r in chosen
+    ])
+    # 与取消接口相同，同时写入取消事件
+    slot_of = dict(db.session.query(Reservation.id, Reservation.time_slot_id).filter(Reservation.id.in_(chosen)))
+    db.session.bulk_insert_mappings(CancellationEvent, [
+        {'reservation_id': r, 'time_slot_id': slot_of[r], 'created_at': now} for r in chosen
+    ])
+    db.session.commit()
+
+
+def check_listing_queries(app, counter):
+    """可申请场次列表的SQL语句数应为常数，不随返回的时间段数增长"""
+    client = app.test_client()
+    first_day = (date.today() + timedelta(days=1)).isoformat()
+    observed = {}
+    for label, url in (('单日', f'/api/timeslots/available?date={first_day}'),
+                       ('全部', '/api/timeslots/available')):
+        start_count = counter.count
+        response = client.get(url)
+        observed[label] = (counter.count - start_count, len(response.get_json()['timeslots']))
+
+    statements = {count for count, _ in observed.values()}
+    detail = '，'.join(f"{label} {slots} 个时间段 {count} 条SQL" for label, (count, slots) in observed.items())
+    return {'check': 'timeslots_available_constant_queries', 'passed': len(statements) == 1, 'detail': detail}
+
+
+def exercise_endpoints(app, args, recorder):
+    """以不同学生身份调用学生端和场地端的主要接口，覆盖在线请求的热点查询"""
+    import numpy as np
+    from flask_jwt_extended import create_access_token
+    from models import db, Student, TimeSlot
+
+    rng = np.random.default_rng(args.seed + 2)
+    client = app.test_client()
+    first_day = (date.today() + timedelta(days=1)).isoformat()
+    student_ids = [s for (s,) in db.session.query(Student.id).order_by(Student.id)]
+    slot_ids = [s for (s,) in db.session.query(TimeSlot.id).filter(TimeSlot.date > date.today())]
+    # 数据准备完毕后开始记录SQL，之后的各阶段均为在线请求或调度任务
+    recorder.active = True
+
+    for student_id in rng.choice(student_ids, size=min(20, len(student_ids)), replace=False).tolist():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=student_id)}'}
+        slot_id = int(rng.choice(slot_ids))
+        client.post('/api/student/apply', json={'timeslot_id': slot_id}, headers=headers)
+        client.post('/api/student/apply_batch', json={'timeslot_ids': rng.choice(slot_ids, size=3).tolist()},
+                    headers=headers)
+        client.get('/api/student/status', headers=headers)
+        client.get('/api/student/status?limit=5', headers=headers)
+        client.get('/api/student/records', headers=headers)
+        client.get('/api/student/credit', headers=headers)
+        client.get('/api/student/dashboard', headers=headers)
+        client.post('/api/student/cancel', json={'timeslot_id': slot_id}, headers=headers)
+        client.post('/api/student/reserve_direct', json={'time_slot_id': int(rng.choice(slot_ids))}, headers=headers)
+
+    client.get('/api/courts')
+    client.get(f'/api/timeslots/reserve_status?date={first_day}')
+    client.get(f'/api/timeslots/available?date={first_day}&court_id=1')
+    client.get('/api/timeslots/available?limit=20&format=columnar')
+
+
+def check_concurrent_booking(app, args, results):
+    """
+    多个客户端并行直接预约少量时间段，每个时间段最多只能产生一条有效预约，每周预约次数不能超出配额；
+    同时统计吞吐量和延迟，写入 results
+    """
+    import threading
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import func
+    from models import db, Court, Student, TimeSlot, Reservation, WeeklyStats
+    from changes import slots_changed
+
+    rng = np.random.default_rng(args.seed + 3)
+    # 在已生成日期之后新建一批没有申请的时间段，供所有客户端争抢
+    day = date.today() + timedelta(days=args.days + 1)
+    court_ids = [c for (c,) in db.session.query(Court.id).order_by(Court.id)]
+    slots = [
+        TimeSlot(court_id=court_ids[i % len(court_ids)], date=day,
+                 start_time=dt_time(6 + i // len(court_ids)), end_time=dt_time(7 + i // len(court_ids)))
+        for i in range(args.contested_slots)
+    ]
+    db.session.add_all(slots)
+    db.session.flush()
+    slot_ids = [slot.id for slot in slots]
+    slots_changed(slot_ids)
+    db.session.commit()
+
+    student_ids = [s for (s,) in db.session.query(Student.id).order_by(Student.id)]
+    clients = rng.choice(student_ids, size=min(args.clients, len(student_ids)), replace=False).tolist()
+    plans = {student_id: rng.choice(slot_ids, size=3).tolist() for student_id in clients}
+    tokens = {student_id: create_access_token(identity=student_id) for student_id in clients}
+    barrier = threading.Barrier(len(clients))
+
+    def run_client(student_id):
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {tokens[student_id]}'}
+        outcomes = []
+        barrier.wait()
+        for slot_id in plans[student_id]:
+            started = time.perf_counter()
+            response = client.post('/api/student/reserve_direct', json={'time_slot_id': slot_id}, headers=headers)
+            outcomes.append((response.status_code, time.perf_counter() - started))
+        return outcomes
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        outcomes = [o for client_outcomes in executor.map(run_client, clients) for o in client_outcomes]
+    elapsed = time.perf_counter() - started
+
+    db.session.expire_all()
+    per_slot = dict(db.session.query(Reservation.time_slot_id, func.count(Reservation.id)).filter(
+        Reservation.time_slot_id.in_(slot_ids),
+        Reservation.is_cancelled == False
+    ).group_by(Reservation.time_slot_id).all())
+    double_booked = sum(1 for count in per_slot.values() if count > 1)
+    over_quota = db.session.query(WeeklyStats.id).filter(
+        WeeklyStats.reservations_count > app.config['MAX_WEEKLY_RESERVATIONS']
+    ).count()
+    succeeded = sum(1 for status, _ in outcomes if status == 201)
+    server_errors = sum(1 for status, _ in outcomes if status >= 500)
+    latencies = sorted(latency for _, latency in outcomes)
+
+    results.update({
+        'clients': len(clients),
+        'requests': len(outcomes),
+        'succeeded': succeeded,
+        'double_booked_slots': double_booked,
+        'over_quota_students': over_quota,
+        'server_errors': server_errors,
+        'throughput_rps': round(len(outcomes) / elapsed, 1),
+        'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'latency_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+    })
+    passed = double_booked == 0 and over_quota == 0 and server_errors == 0 and succeeded == len(per_slot)
+    detail = (f"{results['clients']} 个客户端 {results['requests']} 次请求争抢 {len(slot_ids)} 个时间段，"
+              f"成功 {succeeded}，重复预约 {double_booked}，超出周配额 {over_quota}，服务端错误 {server_errors}，"
+              f"吞吐 {results['throughput_rps']} 次/秒，延迟 p50 {results['latency_p50_ms']}ms "
+              f"p95 {results['latency_p95_ms']}ms")
+    return {'check': 'concurrent_booking_no_double_booking', 'passed': passed, 'detail': detail}
+
+
+def check_login_throughput(app, args, results):
+    """
+    多个客户端并行登录，统计吞吐量、延迟和503次数。模拟数据的密码哈希工作因子为4，
+    每个学生第一次登录时应重新哈希为 --bcrypt-rounds；另测量该工作因子前后各两档（不低于4）单次哈希的耗时，供调整 BCRYPT_ROUNDS 参考
+    """
+    import bcrypt
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from models import db, Student
+    import passwords
+
+    app.config['BCRYPT_ROUNDS'] = args.bcrypt_rounds
+    hash_ms = {}
+    for rounds in range(max(4, args.bcrypt_rounds - 2), args.bcrypt_rounds + 3):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'password123', bcrypt.gensalt(rounds))
+        hash_ms[rounds] = round((time.perf_counter() - started) * 1000, 1)
+
+    rng = np.random.default_rng(args.seed + 4)
+    student_ids = [s for (s,) in db.session.query(Student.student_id).order_by(Student.id)]
+    clients = rng.choice(student_ids, size=min(args.login_clients, len(student_ids)), replace=False).tolist()
+    per_client = max(1, args.logins // len(clients))
+
+    def run_client(student_id):
+        client = app.test_client()
+        outcomes = []
+        for _ in range(per_client):
+            started = time.perf_counter()
+            response = client.post('/api/student/login', json={'student_id': student_id, 'password': 'password123'})
+            outcomes.append((response.status_code, time.perf_counter() - started))
+        return outcomes
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        outcomes = [o for client_outcomes in executor.map(run_client, clients) for o in client_outcomes]
+    elapsed = time.perf_counter() - started
+
+    db.session.expire_all()
+    hashes = [h for (h,) in db.session.query(Student.password_hash).filter(Student.student_id.in_(clients))]
+    not_rehashed = sum(1 for h in hashes if passwords.hash_rounds(h) != args.bcrypt_rounds)
+    succeeded = sum(1 for status, _ in outcomes if status == 200)
+    busy = sum(1 for status, _ in outcomes if status == 503)
+    failed = len(outcomes) - succeeded - busy
+    latencies = sorted(latency for _, latency in outcomes)
+
+    results.update({
+        'clients': len(clients),
+        'requests': len(outcomes),
+        'bcrypt_rounds': args.bcrypt_rounds,
+        'hash_workers': app.config['PASSWORD_HASH_WORKERS'] or os.cpu_count(),
+        'hash_ms_by_rounds': hash_ms,
+        'succeeded': succeeded,
+        'busy': busy,
+        'failed': failed,
+        'not_rehashed': not_rehashed,
+        'throughput_rps': round(len(outcomes) / elapsed, 1),
+        'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'latency_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+    })
+    passed = failed == 0 and succeeded > 0 and not_rehashed == 0
+    detail = (f"{results['clients']} 个客户端 {results['requests']} 次登录（工作因子 {args.bcrypt_rounds}，"
+              f"哈希线程 {results['hash_workers']}），成功 {succeeded}，繁忙 {busy}，其他失败 {failed}，"
+              f"未重新哈希 {not_rehashed}，吞吐 {results['throughput_rps']} 次/秒，"
+              f"延迟 p50 {results['latency_p50_ms']}ms p95 {results['latency_p95_ms']}ms；单次哈希 "
+              + '，'.join(f"{rounds}: {ms}ms" for rounds, ms in hash_ms.items()))
+    return {'check': 'login_rehashes_to_configured_rounds', 'passed': passed, 'detail': detail}
+
+
+def generate_template_slots(args, results):
+    """
+    为所有场地设置每周场次模板，在已生成日期之后展开约 --template-slots 个时间段；
+    再次展开同一范围时不应新建任何时间段
+    """
+    from models import db, Court, TimeSlot, SlotTemplate
+    from schedules import generate_slots
+
+    court_ids = [c for (c,) in db.session.query(Court.id).order_by(Court.id)]
+    hours = list(range(6, 22))
+    start = date.today() + timedelta(days=args.days + 2)
+    db.session.add_all([
+        SlotTemplate(court_id=court_id, weekday=weekday, start_time=dt_time(hour), end_time=dt_time(hour + 1),
+                     start_date=start)
+        for court_id in court_ids for weekday in range(7) for hour in hours
+    ])
+    db.session.commit()
+
+    days = -(-args.template_slots // (len(court_ids) * len(hours)))
+    end = start + timedelta(days=days - 1)
+    results['created'] = len(generate_slots(start, end))
+    db.session.commit()
+    results['regenerated'] = len(generate_slots(start, end))
+    db.session.commit()
+    results['expected'] = days * len(court_ids) * len(hours)
+    results['stored'] = db.session.query(TimeSlot.id).filter(TimeSlot.date.between(start, end)).count()
+
+
+def import_timeslots(app, args, results):
+    """
+    在场次模板已展开的日期上通过导入接口提交 --import-slots 个不重叠的时间段（模板场次之前的凌晨时段），
+    其中1%另附一个跨过模板第一个场次的时间段：第一次提交应一次列出全部冲突且不写入，去掉后应全部写入
+    """
+    from flask_jwt_extended import create_access_token
+    from models import db, Court, TimeSlot
+
+    court_ids = [c for (c,) in db.session.query(Court.id).order_by(Court.id)]
+    start = date.today() + timedelta(days=args.days + 2)
+    minutes = range(3 * 60, 6 * 60, 30)
+    per_day = len(court_ids) * len(minutes)
+    clean = []
+    for k in range(args.import_slots):
+        m = minutes[k % len(minutes)]
+        clean.append({
+            'court_id': court_ids[(k // len(minutes)) % len(court_ids)],
+            'date': (start + timedelta(days=k // per_day)).isoformat(),
+            'start_time': f'{m // 60:02d}:{m % 60:02d}',
+            'end_time': f'{(m + 30) // 60:02d}:{(m + 30) % 60:02d}'
+        })
+    # 5:45-6:15 与本批的5:30-6:00及已写入的6:00-7:00同时重叠
+    overlapping = [dict(item, start_time='05:45', end_time='06:15') for item in clean[len(minutes) - 1::len(minutes)]]
+    overlapping = overlapping[:max(1, args.import_slots // 100)]
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+    before = db.session.query(TimeSlot.id).count()
+    rejected = client.post('/api/timeslots/import', json={'slots': clean + overlapping}, headers=headers)
+    results['conflicts_expected'] = len(overlapping)
+    results['conflicts_reported'] = len(rejected.get_json().get('errors', []))
+    results['rejected_status'] = rejected.status_code
+    results['written_on_conflict'] = db.session.query(TimeSlot.id).count() - before
+
+    started = time.perf_counter()
+    accepted = client.post('/api/timeslots/import', json={'slots': clean}, headers=headers)
+    results['import_time'] = time.perf_counter() - started
+    results['proposed'] = len(clean)
+    results['created'] = accepted.get_json().get('created')
+
+
+def check_allocation_quota(app):
+    """夜间分配后任何学生的本周预约次数都不应超出 MAX_WEEKLY_RESERVATIONS"""
+    from sqlalchemy import func
+    from models import db, Application, WeeklyStats, ApplicationStatus
+
+    limit = app.config['MAX_WEEKLY_RESERVATIONS']
+    over_quota = db.session.query(WeeklyStats.id).filter(WeeklyStats.reservations_count > limit).count()
+    busiest = db.session.query(func.max(WeeklyStats.reservations_count)).scalar() or 0
+    approved = db.session.query(Application.id).filter(Application.status == ApplicationStatus.APPROVED).count()
+    return {
+        'check': 'allocation_respects_weekly_quota',
+        'passed': over_quota == 0,
+        'detail': f"中签申请 {approved} 个，超出周配额的学生 {over_quota} 个，单个学生最多 {busiest} 次（上限 {limit}）"
+    }
+
+
+def check_dashboard_unseen_court(app):
+    """
+    其他进程或脚本写入、本进程场地注册表尚未加载的场地：学生主页和申请状态接口不应报错，且能给出场地名称。
+    场地、时间段、申请和预约直接经数据库连接写入，不经过ORM会话，不触发注册表重新加载
+    """
+    from flask_jwt_extended import create_access_token
+    from models import db, Court, Student, TimeSlot, Application, Reservation, ApplicationStatus
+
+    name = '注册表外场地'
+    day = date.today() + timedelta(days=1)
+    with db.engine.begin() as conn:
+        student_id = conn.execute(db.select(Student.id).order_by(Student.id).limit(1)).scalar_one()
+        court_id = conn.execute(db.insert(Court).values(name=name, location='外部写入', capacity=2, is_active=True)).inserted_primary_key[0]
+        slots = conn.execute(db.insert(TimeSlot).returning(TimeSlot.id), [
+            {'court_id': court_id, 'date': day, 'start_time': dt_time(hour), 'end_time': dt_time(hour + 1),
+             'is_available': hour == 6}
+            for hour in (6, 7)
+        ]).scalars().all()
+        conn.execute(db.insert(Application).values(student_id=student_id, time_slot_id=slots[0],
+                                                   status=ApplicationStatus.PENDING))
+        conn.execute(db.insert(Reservation).values(student_id=student_id, time_slot_id=slots[1]))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=student_id)}'}
+    dashboard = client.get('/api/student/dashboard', headers=headers)
+    status = client.get('/api/student/status', headers=headers)
+    names = []
+    if dashboard.status_code == 200:
+        body = dashboard.get_json()
+        names += [item['court_name'] for item in body['active_applications'] + body['upcoming_reservations']
+                  if item['court_id'] == court_id]
+    if status.status_code == 200:
+        names += [item['court_name'] for item in status.get_json()['applications'] if item['court_id'] == court_id]
+    return {
+        'check': 'dashboard_handles_unseen_court',
+        'passed': dashboard.status_code == status.status_code == 200 and len(names) == 3
+                  and all(n == name for n in names),
+        'detail': f"主页 {dashboard.status_code}，申请状态 {status.status_code}，场地名称 {names}"
+    }
+
+
+def check_query_plans(engine, recorder):
+    """
+    热点查询不应对任何数据表做全表扫描：EXPLAIN QUERY PLAN 中的 SCAN 行只允许 USING INDEX 或 USING INTEGER PRIMARY KEY，
+    SCAN <表> 和 SCAN <表> USING COVERING INDEX 都视为全表扫描。计划中的表以别名出现时按语句中的 FROM/JOIN 还原为表名
+    """
+    import re
+    from models import db
+
+    tables = set(db.metadata.tables)
+    full_scans = []
+    with engine.connect() as conn:
+        for statement, parameters in recorder.statements.items():
+            aliases = {
+                alias: table
+                for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)', statement, re.IGNORECASE)
+                if table in tables
+            }
+            plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, tuple(parameters)).all()
+            for row in plan:
+                match = re.match(r'SCAN (\w+)', row[-1])
+                if not match or re.search(r'USING (INDEX|INTEGER PRIMARY KEY)\b', row[-1]):
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                if table in tables:
+                    full_scans.append(f"{table}（{row[-1]}）: {' '.join(statement.split())[:120]}")
+
+    detail = f"检查 {len(recorder.statements)} 条语句"
+    if full_scans:
+        detail += '，全表扫描:\n    ' + '\n    '.join(full_scans)
+    return {'check': 'hot_queries_use_indexes', 'passed': not full_scans, 'detail': detail}
+
+
+def git_revision():
+    """当前代码版本，便于对比不同版本的结果"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous_path, current):
+    """打印与之前结果的对比"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    before = {p['phase']: p for p in previous.get('phases', [])}
+
+    print(f"\n与 {previous.get('revision') or previous_path} 对比:")
+    for phase in current['phases']:
+        old = before.get(phase['phase'])
+        if not old:
+            continue
+        ratio = phase['wall_time'] / old['wall_time'] if old['wall_time'] else float('inf')
+        print(f"  {phase['phase']:<28} 耗时 {old['wall_time']:.3f}s -> {phase['wall_time']:.3f}s "
+              f"(x{ratio:.2f})  SQL {old['sql_statements']} -> {phase['sql_statements']}")
+
+
+def run_benchmark(args):
+    """运行完整基准测试并返回结果"""
+    app = create_benchmark_app(args.db)
+
+    from models import db
+    from scheduler import fair_allocation_algorithm, update_credit_scores, handle_cancellation_queue
+
+    print(f"基准测试数据库: {args.db}")
+    print(f"参数: 学生 {args.students}，场地 {args.courts}，天数 {args.days}，申请 {args.applications}，"
+          f"分布 {args.distribution}，种子 {args.seed}\n")
+
+    phases = []
+    checks = []
+    trace_memory = not args.no_memory
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+        recorder = QueryRecorder(db.engine)
+
+        phases.append(measure('populate', lambda: populate(args), counter, trace_memory))
+        phases.append(measure('endpoints', lambda: exercise_endpoints(app, args, recorder), counter, trace_memory))
+        phases.append(measure('timeslots_available', lambda: checks.append(check_listing_queries(app, counter)),
+                              counter, trace_memory))
+        recorder.active = False
+        booking = {}
+        phases.append(measure('concurrent_booking', lambda: checks.append(check_concurrent_booking(app, args, booking)),
+                              counter, trace_memory))
+        phases[-1]['booking'] = booking
+        logins = {}
+        phases.append(measure('login_throughput', lambda: checks.append(check_login_throughput(app, args, logins)),
+                              counter, trace_memory))
+        phases[-1]['logins'] = logins
+        recorder.active = True
+        phases.append(measure('fair_allocation_algorithm', fair_allocation_algorithm, counter, trace_memory))
+        recorder.active = False
+        checks.append(check_allocation_quota(app))
+        recorder.active = True
+        phases.append(measure('update_credit_scores', update_credit_scores, counter, trace_memory))
+        recorder.active = False
+        cancel_reservations(args)
+        recorder.active = True
+        phases.append(measure('handle_cancellation_queue', handle_cancellation_queue, counter, trace_memory))
+        recorder.active = False
+        checks.append(check_query_plans(db.engine, recorder))
+
+        generated = {}
+        phases.append(measure('generate_template_slots', lambda: generate_template_slots(args, generated),
+                              counter, trace_memory))
+        phases[-1]['generated'] = generated
+        checks.append({
+            'check': 'template_generation_idempotent',
+            'passed': generated['created'] == generated['expected'] == generated['stored'] and not generated['regenerated'],
+            'detail': f"生成 {generated['created']} 个时间段（应为 {generated['expected']}），"
+                      f"重复生成新建 {generated['regenerated']} 个"
+        })
+
+        imported = {}
+        phases.append(measure('import_timeslots', lambda: import_timeslots(app, args, imported), counter, trace_memory))
+        phases[-1]['imported'] = imported
+        checks.append({
+            'check': 'timeslot_import_reports_all_conflicts',
+            'passed': imported['rejected_status'] == 400 and not imported['written_on_conflict']
+                      and imported['conflicts_reported'] == imported['conflicts_expected']
+                      and imported['created'] == imported['proposed'],
+            'detail': f"报告冲突 {imported['conflicts_reported']} 个（应为 {imported['conflicts_expected']}），"
+                      f"冲突时写入 {imported['written_on_conflict']} 个；导入 {imported['created']}/{imported['proposed']} 个"
+                      f"时间段耗时 {imported['import_time']:.3f}s"
+        })
+        checks.append(check_dashboard_unseen_court(app))
+
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'phases': phases,
+        'checks': checks,
+    }
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    print("FairCourt 调度任务基准测试")
+    print("=" * 30)
+
+    result = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if args.compare:
+        compare_results(args.compare, result)
+
+    print("\n检查项:")
+    for check in result['checks']:
+        print(f"  [{'通过' if check['passed'] else '失败'}] {check['check']}: {check['detail']}")
+    if not all(check['passed'] for check in result['checks']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
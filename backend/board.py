@@ -0,0 +1,115 @@
+"""
+时间段看板
+slot_board 表按时间段保存 /api/timeslots/reserve_status 需要的全部字段，
+查询某天的预约状态只需按日期读一次索引。
+时间段、申请或预约发生变化时由 changes.slots_changed 登记，提交前调用 refresh_slots 按源数据重算
+"""
+
+from datetime import datetime
+from sqlalchemy import case, func, select, literal
+from models import db, Application, Reservation, TimeSlot, Student, SlotBoard, ApplicationStatus
+import template_registry
+
+BOARD_COLUMNS = [
+    'time_slot_id', 'court_id', 'date', 'start_time', 'end_time', 'is_available',
+    'pending_count', 'approved_count', 'is_reserved',
+    'reserver_name', 'reserver_student_id', 'reserved_at', 'updated_at'
+]
+
+
+def id_filter(column, ids):
+    """按一组已排序的ID筛选；ID连续时（如批量写入的新时间段）用区间条件代替逐个绑定参数的IN"""
+    if ids[-1] - ids[0] + 1 == len(ids):
+        return column.between(ids[0], ids[-1])
+    return column.in_(ids)
+
+
+def chunks(slot_ids, size=500):
+    """排序去重后按固定大小分块"""
+    slot_ids = sorted(set(slot_ids))
+    return [slot_ids[i:i + size] for i in range(0, len(slot_ids), size)]
+
+
+def board_rows(slot_ids, now):
+    """按源数据计算一组时间段（已排序）的看板行"""
+    applications = Application.__table__
+    reservations = Reservation.__table__
+    time_slots = TimeSlot.__table__
+    students = Student.__table__
+
+    counts = select(
+        applications.c.time_slot_id,
+        func.sum(case((applications.c.status == ApplicationStatus.PENDING, 1), else_=0)).label('pending'),
+        func.sum(case((applications.c.status == ApplicationStatus.APPROVED, 1), else_=0)).label('approved')
+    ).where(
+        id_filter(applications.c.time_slot_id, slot_ids)
+    ).group_by(applications.c.time_slot_id).subquery()
+
+    active = select(
+        reservations.c.time_slot_id,
+        func.min(reservations.c.id).label('reservation_id')
+    ).where(
+        id_filter(reservations.c.time_slot_id, slot_ids),
+        reservations.c.is_cancelled == False
+    ).group_by(reservations.c.time_slot_id).subquery()
+
+    return select(
+        time_slots.c.id, time_slots.c.court_id, time_slots.c.date,
+        time_slots.c.start_time, time_slots.c.end_time, time_slots.c.is_available,
+        func.coalesce(counts.c.pending, 0), func.coalesce(counts.c.approved, 0),
+        active.c.reservation_id.isnot(None),
+        students.c.name, students.c.student_id, reservations.c.created_at,
+        literal(now, SlotBoard.updated_at.type)
+    ).select_from(
+        time_slots.outerjoin(counts, counts.c.time_slot_id == time_slots.c.id)
+        .outerjoin(active, active.c.time_slot_id == time_slots.c.id)
+        .outerjoin(reservations, reservations.c.id == active.c.reservation_id)
+        .outerjoin(students, students.c.id == reservations.c.student_id)
+    ).where(id_filter(time_slots.c.id, slot_ids))
+
+
+def refresh_slots(slot_ids):
+    """重算指定时间段的看板行（不提交事务）"""
+    board = SlotBoard.__table__
+    now = datetime.utcnow()
+    for chunk in chunks(slot_ids):
+        db.session.execute(board.delete().where(id_filter(board.c.time_slot_id, chunk)))
+        db.session.execute(board.insert().from_select(BOARD_COLUMNS, board_rows(chunk, now)))
+
+
+def backfill_board():
+    """为还没有看板行的时间段生成看板行，返回生成的行数"""
+    board = SlotBoard.__table__
+    missing = db.session.execute(
+        select(TimeSlot.id).outerjoin(
+            board, board.c.time_slot_id == TimeSlot.id
+        ).where(board.c.time_slot_id.is_(None))
+    ).scalars().all()
+    refresh_slots(missing)
+    return len(missing)
+
+
+def slot_status(is_available, is_reserved, pending_count):
+    """时间段对外展示的状态，与可申请场次列表一致"""
+    if is_reserved or not is_available:
+        return 'reserved'
+    if pending_count > 0:
+        return 'has_applications'
+    return 'available'
+
+
+def slot_event(row):
+    """
+    由看板行生成时间段状态变化事件；时间段由场次模板的虚拟时间段写入时，
+    virtual_id 为原来的虚拟时间段ID，客户端据此替换列表中对应的行
+    """
+    return {
+        'slot_id': row.time_slot_id,
+        'virtual_id': template_registry.virtual_id_of(row.court_id, row.date, row.start_time, row.end_time),
+        'court_id': row.court_id,
+        'date': row.date.isoformat(),
+        'start_time': row.start_time.strftime('%H:%M'),
+        'end_time': row.end_time.strftime('%H:%M'),
+        'status': slot_status(row.is_available, row.is_reserved, row.pending_count),
+        'pending_count': row.pending_count
+    }
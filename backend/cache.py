@@ -0,0 +1,98 @@
+"""
+时间段查询接口的响应缓存
+每个日期维护一个版本号，写操作提交后递增受影响日期的版本号（见 changes.py）；
+缓存条目按 (接口, 日期, 场地) 保存生成时的版本号、响应数据及各格式的响应体和ETag，版本号未变时直接返回缓存，
+请求携带的 If-None-Match 与ETag一致时返回304，均不访问数据库。
+版本号和缓存保存在进程内存中，只有本进程提交的写操作会递增版本号；其他进程（另一个工作进程、run.py/reset_db.py等脚本）
+的写入无法通知到这里，因此条目最长保留 RESPONSE_CACHE_TTL 秒，过期后重新生成。ETag由响应体计算，数据未变时重新生成的ETag不变，
+客户端仍然得到304
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request, json
+import negotiation
+
+_lock = threading.Lock()
+_versions = {}        # 日期 -> 版本号
+_global_version = 0   # 任一日期变化时递增，用于不指定日期的查询
+_entries = OrderedDict()
+
+
+def bump(dates):
+    """递增指定日期及全局的版本号"""
+    global _global_version
+    with _lock:
+        for day in dates:
+            _versions[day] = _versions.get(day, 0) + 1
+        _global_version += 1
+
+
+def current_version(day):
+    """日期的当前版本号，不指定日期时返回全局版本号"""
+    with _lock:
+        return _global_version if day is None else _versions.get(day, 0)
+
+
+def not_modified(etag):
+    """构造304响应"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def cached_response(key, day, build):
+    """
+    返回缓存的响应，缓存失效或超过 RESPONSE_CACHE_TTL 秒时调用 build() 生成 (数据, 状态码)；只缓存200响应。
+    版本号在生成前读取，生成期间发生的写入会让该条目在下次请求时失效。
+    同一条目按协商出的格式和压缩方式分别缓存序列化结果，各自带有不同的ETag
+    """
+    version = current_version(day)
+    ttl = current_app.config['RESPONSE_CACHE_TTL']
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry['version'] == version and time.monotonic() - entry['built_at'] < ttl:
+            _entries.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        built_at = time.monotonic()
+        payload, status = build()
+        if status != 200:
+            return current_app.response_class(json.dumps(payload), status=status, mimetype='application/json')
+        entry = {'version': version, 'built_at': built_at, 'payload': payload, 'variants': {}}
+        with _lock:
+            _entries[key] = entry
+            _entries.move_to_end(key)
+            while len(_entries) > current_app.config['RESPONSE_CACHE_SIZE']:
+                _entries.popitem(last=False)
+
+    negotiated = (negotiation.choose_media_type(), negotiation.choose_encoding())
+    variant = entry['variants'].get(negotiated)
+    if variant is None:
+        media_type, encoding = negotiated
+        body = negotiation.serialize(entry['payload'], media_type)
+        etag = hashlib.sha1(body).hexdigest()
+        body, encoding = negotiation.compress(body, encoding)
+        if encoding:
+            etag = f'{etag}-{encoding}'
+        variant = (media_type, body, etag, encoding)
+        entry['variants'][negotiated] = variant
+
+    media_type, body, etag, encoding = variant
+    if etag in request.if_none_match:
+        return not_modified(etag)
+
+    response = current_app.response_class(body, status=200, mimetype=media_type)
+    response.set_etag(etag)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # 浏览器每次使用前都携带ETag重新验证，数据未变时只需304
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
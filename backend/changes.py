@@ -0,0 +1,89 @@
+"""
+数据变更通知
+写操作调用 slots_changed 登记受影响的时间段，登记保存在当前会话中：
+事务提交前统一刷新这些时间段的看板行，与数据变更在同一事务中生效；
+提交成功后递增这些时间段所在日期的响应缓存版本号，并向事件总线发布这些时间段的最新状态；
+事务回滚时丢弃登记。场地或场次模板经ORM修改并提交后重新加载场地注册表或模板注册表；每周配额变化提交后清除对应的配额缓存（见 quota.py）
+"""
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from models import db, SlotBoard, Court, SlotTemplate
+import board
+import cache
+import events
+import court_registry
+import template_registry
+import quota
+
+CHANGED_SLOTS_KEY = 'changed_slots'
+CHANGED_DATES_KEY = 'changed_dates'
+SLOT_EVENTS_KEY = 'slot_events'
+COURTS_CHANGED_KEY = 'courts_changed'
+TEMPLATES_CHANGED_KEY = 'templates_changed'
+
+
+def slots_changed(slot_ids):
+    """登记当前事务中发生变化的时间段"""
+    db.session.info.setdefault(CHANGED_SLOTS_KEY, set()).update(slot_ids)
+
+
+@event.listens_for(Session, 'before_commit')
+def refresh_changed_slots(session):
+    slot_ids = session.info.pop(CHANGED_SLOTS_KEY, None)
+    if slot_ids:
+        session.flush()
+        board.refresh_slots(slot_ids)
+        slot_board = SlotBoard.__table__
+        for chunk in board.chunks(slot_ids):
+            rows = session.execute(
+                select(slot_board).where(board.id_filter(slot_board.c.time_slot_id, chunk)).order_by(slot_board.c.time_slot_id)
+            ).all()
+            session.info.setdefault(CHANGED_DATES_KEY, set()).update(row.date for row in rows)
+            session.info.setdefault(SLOT_EVENTS_KEY, []).extend(board.slot_event(row) for row in rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_changed_slots(session):
+    dates = session.info.pop(CHANGED_DATES_KEY, None)
+    if dates:
+        cache.bump(dates)
+    events.publish(session.info.pop(SLOT_EVENTS_KEY, None))
+    students = session.info.pop(quota.CHANGED_QUOTAS_KEY, None)
+    if students:
+        quota.invalidate(students)
+    courts_changed = session.info.pop(COURTS_CHANGED_KEY, False)
+    templates_changed = session.info.pop(TEMPLATES_CHANGED_KEY, False)
+    if courts_changed or templates_changed:
+        # 提交后的回调中当前会话不能再执行SQL，使用独立连接读取
+        with db.engine.connect() as connection:
+            if courts_changed:
+                court_registry.reload(connection)
+            if templates_changed:
+                template_registry.reload(connection)
+
+
+@event.listens_for(Court, 'after_insert')
+@event.listens_for(Court, 'after_update')
+@event.listens_for(Court, 'after_delete')
+def court_changed(mapper, connection, target):
+    object_session(target).info[COURTS_CHANGED_KEY] = True
+
+
+@event.listens_for(SlotTemplate, 'after_insert')
+@event.listens_for(SlotTemplate, 'after_update')
+@event.listens_for(SlotTemplate, 'after_delete')
+def template_changed(mapper, connection, target):
+    object_session(target).info[TEMPLATES_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_changed_slots(session, previous_transaction):
+    # 保存点回滚时外层事务中已登记的时间段仍然有效，只有整个事务回滚时才丢弃
+    if previous_transaction.parent is None:
+        session.info.pop(CHANGED_SLOTS_KEY, None)
+        session.info.pop(CHANGED_DATES_KEY, None)
+        session.info.pop(SLOT_EVENTS_KEY, None)
+        session.info.pop(COURTS_CHANGED_KEY, None)
+        session.info.pop(TEMPLATES_CHANGED_KEY, None)
+        session.info.pop(quota.CHANGED_QUOTAS_KEY, None)
@@ -16,4 +16,56 @@ class Config:
     # 预约系统配置
     MAX_WEEKLY_RESERVATIONS = 3  # 每周最大预约次数
     ALLOCATION_TIME = "22:00"    # 每日分配时间
-    ADVANCE_DAYS = 2             # 提前预约天数 
\ No newline at end of file
+    ADVANCE_DAYS = 2             # 提前预约天数，调度任务每天为这些天写入场次模板产生的时间段
+    # 查询接口展示场次模板虚拟时间段的天数，申请或预约时才写入数据库
+    SCHEDULE_HORIZON_DAYS = 14
+    
+    # 夜间分配时每个时间段读取的候选人数（中签者因时间冲突被顺延时使用）
+    ALLOCATION_TOP_K = 5
+    # 夜间分配每次提交的时间段数，写锁最长只持有一个分块
+    ALLOCATION_CHUNK_SIZE = 200     
+    # 过期数据归档：保留天数、每批行数、批次间休眠秒数；归档目录默认为实例目录下的archive
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+    ARCHIVE_RETENTION_DAYS = 30
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_BATCH_PAUSE = 0.1
+    
+    # 时间段查询接口的响应缓存条目上限（按接口、日期、场地分别缓存）
+    RESPONSE_CACHE_SIZE = 256
+    # 响应缓存条目最长保留秒数，其他进程写入的数据最迟在此之后可见
+    RESPONSE_CACHE_TTL = 5
+    
+    # 列表接口分页：每页条数上限；流式输出时服务端游标每批读取的行数
+    PAGE_SIZE_MAX = 500
+    STREAM_BATCH_SIZE = 500
+    
+    # 时间段状态推送：进程内保留的最近事件数、SSE心跳间隔秒数、长轮询最长等待秒数
+    EVENT_BUFFER_SIZE = 1000
+    EVENT_HEARTBEAT_SECONDS = 15
+    LONG_POLL_TIMEOUT = 25
+    
+    # 响应体达到该字节数时才按 Accept-Encoding 压缩（gzip，安装brotli后优先br）
+    COMPRESS_MIN_SIZE = 1024
+    
+    # 批量申请接口一次最多提交的时间段数
+    BATCH_APPLY_MAX = 50
+    
+    # 时间段导入接口一次最多提交的时间段数
+    TIMESLOT_IMPORT_MAX = 10000
+    
+    # 每周配额读取缓存：条目上限、最长保留秒数（多进程部署时其他进程的写入最迟在此之后可见）
+    QUOTA_CACHE_SIZE = 4096
+    QUOTA_CACHE_TTL = 30
+    
+    # 密码哈希：bcrypt工作因子（登录时自动把旧哈希升级到该值）、线程池大小（0表示CPU核数）、
+    # 排队与执行中的任务上限、无空位时的最长等待秒数（超时返回503）
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0)
+    PASSWORD_HASH_QUEUE = 64
+    PASSWORD_HASH_TIMEOUT = 2
+    
+    # 场地注册表最长多少秒后重新加载，其他进程或脚本写入的场地最迟在此之后可见
+    COURT_REGISTRY_TTL = 30
+    
+    # /api/courts 响应允许浏览器缓存的秒数
+    COURTS_MAX_AGE = 300
@@ -0,0 +1,100 @@
+"""
+场地注册表（进程内）
+场地信息很少变化，创建应用时一次性加载到内存，各接口直接从这里读取场地名称、位置和启用状态，
+时间段查询不再为此联表。场地通过ORM新增、修改或删除并提交后自动重新加载（见 changes.py），
+版本号随之递增，时间段查询的响应缓存以版本号区分，旧条目自然失效。多进程部署时各进程独立维护：
+其他进程或脚本写入的场地无法通知到这里，因此读取时若距上次加载已超过 COURT_REGISTRY_TTL 秒则重新加载，
+按ID查找不到时按主键查询数据库，场地确实存在则立即重新加载。数据未变时版本号不变
+"""
+
+import hashlib
+import threading
+import time
+from sqlalchemy import select
+from flask import json, current_app, has_app_context
+from models import db, Court
+
+_lock = threading.Lock()
+_courts = {}      # 场地ID -> 场地信息
+_version = 0
+_etag = None
+_loaded_at = None
+
+
+def reload(connection=None):
+    """从数据库重新加载全部场地；在事务提交后的回调中调用时需传入独立连接"""
+    global _courts, _version, _etag, _loaded_at
+    courts = Court.__table__
+    statement = select(courts).order_by(courts.c.id)
+    if connection is None:
+        rows = db.session.execute(statement).all()
+    else:
+        rows = connection.execute(statement).all()
+
+    loaded = {
+        row.id: {
+            'id': row.id,
+            'name': row.name,
+            'location': row.location,
+            'capacity': row.capacity,
+            'is_active': row.is_active
+        }
+        for row in rows
+    }
+    etag = hashlib.sha1(json.dumps(list(loaded.values())).encode('utf-8')).hexdigest()
+    with _lock:
+        if etag != _etag:
+            _courts = loaded
+            _version += 1
+            _etag = etag
+        _loaded_at = time.monotonic()
+
+
+def _age():
+    """距上次加载的秒数，从未加载时为无穷大"""
+    return float('inf') if _loaded_at is None else time.monotonic() - _loaded_at
+
+
+def _revalidate():
+    """超过 COURT_REGISTRY_TTL 秒未加载时重新加载；不在应用上下文中时（如提交回调）跳过"""
+    if has_app_context() and _age() >= current_app.config['COURT_REGISTRY_TTL']:
+        reload()
+
+
+def get(court_id):
+    """按ID获取场地信息，不存在时返回None；注册表中没有时查询数据库，存在则重新加载"""
+    try:
+        court_id = int(court_id)
+    except (TypeError, ValueError):
+        return None
+    _revalidate()
+    court = _courts.get(court_id)
+    if court is None and has_app_context():
+        courts = Court.__table__
+        if db.session.execute(select(courts.c.id).where(courts.c.id == court_id)).first() is not None:
+            reload()
+            court = _courts.get(court_id)
+    return court
+
+
+def active_courts():
+    """所有启用的场地，按ID排序"""
+    _revalidate()
+    return [court for court in _courts.values() if court['is_active']]
+
+
+def active_ids():
+    """所有启用场地的ID"""
+    return [court['id'] for court in active_courts()]
+
+
+def version():
+    """注册表版本号，重新加载后数据有变化时递增"""
+    _revalidate()
+    return _version
+
+
+def etag():
+    """当前场地数据的ETag"""
+    _revalidate()
+    return _etag
@@ -0,0 +1,74 @@
+"""
+信用评分
+按天对已结束的预约判定爽约：未取消、未完成的预约视为爽约，扣减学生信用分。
+处理进度记录在水位线表中，调度器停机错过的日期会在下一次执行时一并补算
+"""
+
+from sqlalchemy import case, func, select
+from models import db, Reservation, TimeSlot, Student, JobWatermark
+from priority import refresh_pending_weights
+from datetime import datetime, date, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'update_credit_scores'
+NO_SHOW_PENALTY = 10  # 每次爽约扣分
+
+
+def score_no_shows(today=None):
+    """
+    判定水位线之后到昨天为止的所有爽约并扣分（不提交事务）
+    返回 (处理的起始日期, 结束日期, 爽约次数)，没有待处理的日期时返回None
+    """
+    today = today or date.today()
+    end_date = today - timedelta(days=1)
+
+    watermark = db.session.get(JobWatermark, JOB_NAME)
+    if watermark is None:
+        # 首次运行只处理昨天，不追溯历史数据
+        watermark = JobWatermark(job_name=JOB_NAME, last_date=end_date - timedelta(days=1))
+        db.session.add(watermark)
+    start_date = watermark.last_date + timedelta(days=1)
+    if start_date > end_date:
+        return None
+
+    reservations = Reservation.__table__
+    time_slots = TimeSlot.__table__
+    students = Student.__table__
+    day_slots = select(time_slots.c.id).where(time_slots.c.date.between(start_date, end_date))
+    unscored = [
+        reservations.c.time_slot_id.in_(day_slots),
+        reservations.c.is_cancelled == False,
+        reservations.c.is_completed == False,
+        reservations.c.no_show == False
+    ]
+
+    # 先按学生汇总爽约次数并一次性扣分，最低不低于0分
+    counts = select(
+        reservations.c.student_id, func.count().label('missed')
+    ).where(*unscored).group_by(reservations.c.student_id).subquery()
+    penalty = counts.c.missed * NO_SHOW_PENALTY
+    penalized = db.session.execute(
+        students.update().where(
+            students.c.id == counts.c.student_id
+        ).values(
+            no_show_count=func.coalesce(students.c.no_show_count, 0) + counts.c.missed,
+            credit_score=case(
+                (students.c.credit_score > penalty, students.c.credit_score - penalty),
+                else_=0
+            )
+        ).returning(students.c.id)
+    ).scalars().all()
+
+    # 再标记爽约，与扣分在同一事务中
+    missed = db.session.execute(
+        reservations.update().where(*unscored).values(no_show=True)
+    ).rowcount
+
+    # 信用分变化后同步这些学生待处理申请的权重
+    refresh_pending_weights(penalized)
+
+    watermark.last_date = end_date
+    watermark.updated_at = datetime.utcnow()
+    return start_date, end_date, missed
@@ -0,0 +1,59 @@
+"""
+时间段状态事件总线（进程内）
+写操作提交后由 changes.py 发布受影响时间段的最新状态，每个事件分配递增的序号；
+最近 EVENT_BUFFER_SIZE 个事件保存在内存中，SSE 和长轮询客户端按序号续读。
+客户端落后超过缓冲区时需要重新加载完整列表
+"""
+
+import threading
+from collections import deque
+
+_condition = threading.Condition()
+_events = deque()
+_last_id = 0
+_buffer_size = 1000
+
+
+def configure(buffer_size):
+    """设置缓冲区大小"""
+    global _buffer_size
+    with _condition:
+        _buffer_size = buffer_size
+        while len(_events) > _buffer_size:
+            _events.popleft()
+
+
+def publish(payloads):
+    """发布一组事件并唤醒所有等待的客户端"""
+    global _last_id
+    if not payloads:
+        return
+    with _condition:
+        for payload in payloads:
+            _last_id += 1
+            _events.append((_last_id, payload))
+        while len(_events) > _buffer_size:
+            _events.popleft()
+        _condition.notify_all()
+
+
+def last_event_id():
+    """最新事件的序号"""
+    with _condition:
+        return _last_id
+
+
+def wait_for_events(since, timeout):
+    """
+    返回序号大于since的事件列表 [(序号, 事件)]，没有新事件时最多等待timeout秒；
+    since早于缓冲区中最早的事件时返回None，表示客户端需要重新加载
+    """
+    with _condition:
+        if since > _last_id:
+            # 服务重启后序号从头开始，客户端持有的旧序号已无意义
+            return None
+        if since == _last_id:
+            _condition.wait(timeout)
+        if _events and since < _events[0][0] - 1:
+            return None
+        return [(event_id, payload) for event_id, payload in _events if event_id > since]
@@ -0,0 +1,120 @@
+"""
+时间段冲突检测
+同一场地同一天的时间段按开始时间排序，并记录结束时间的前缀最大值：与 [开始, 结束) 重叠的区间
+只可能出现在开始时间早于结束的前缀中，从该前缀末尾向前查找，前缀最大结束时间不晚于开始时停止。
+结果不依赖已有时间段互不重叠；已有时间段互不重叠时（创建和导入接口拒绝重叠，通常如此）结束时间也有序，
+每次查询 O(log n + 冲突数)，否则前面一个很长的时间段会使查找途经其后所有时间段，最坏 O(n)，n 为该场地当天的时间段数。
+区间索引包含数据库中的时间段，以及场次模板在这些日期产生、尚未写入数据库的场次（见 schedules.py）。
+
+批量检查时拟新建的时间段排序后逐组扫描，组内用按结束时间排序的堆维护仍在进行中的时间段，
+整体 O(n log n)，一次给出全部冲突
+"""
+
+import bisect
+import heapq
+from collections import namedtuple
+from itertools import accumulate, groupby
+from sqlalchemy import select, tuple_
+from models import TimeSlot, db
+from board import chunks
+import template_registry
+
+# slot_id 为数据库中的时间段ID，或场次模板虚拟时间段的字符串ID
+Interval = namedtuple('Interval', 'start end slot_id')
+
+# 冲突：拟新建时间段的序号、与之重叠的已有区间、与之重叠的排在前面的拟新建时间段序号
+Conflict = namedtuple('Conflict', 'index existing proposed')
+
+
+class IntervalIndex:
+    """按 (场地ID, 日期) 分组的区间索引"""
+
+    def __init__(self, groups):
+        self._groups = {}
+        for key, items in groups.items():
+            items = sorted(items, key=lambda item: (item.start, item.end))
+            self._groups[key] = (
+                items,
+                [item.start for item in items],
+                list(accumulate((item.end for item in items), max))
+            )
+
+    @classmethod
+    def load(cls, keys):
+        """读取这些 (场地ID, 日期) 的时间段，每500组一条查询，并加入场次模板产生的场次"""
+        groups = {key: [] for key in keys}
+        slots = TimeSlot.__table__
+        for chunk in chunks(groups):
+            rows = db.session.execute(
+                select(slots.c.id, slots.c.court_id, slots.c.date, slots.c.start_time, slots.c.end_time)
+                .where(tuple_(slots.c.court_id, slots.c.date).in_(chunk))
+            )
+            for row in rows:
+                groups[(row.court_id, row.date)].append(Interval(row.start_time, row.end_time, row.id))
+
+        templates = {}
+        for template in template_registry.active_templates():
+            templates.setdefault(template.court_id, []).append(template)
+        for (court_id, day), items in groups.items():
+            stored = {(item.start, item.end) for item in items}
+            items.extend(
+                Interval(t.start_time, t.end_time, template_registry.virtual_id(t.id, day))
+                for t in templates.get(court_id, ())
+                if template_registry.occurs_on(t, day) and (t.start_time, t.end_time) not in stored
+            )
+        return cls(groups)
+
+    def overlapping(self, court_id, day, start, end):
+        """与 [start, end) 重叠的区间，按开始时间排序；已有区间互不重叠时 O(log n + 结果数)，最坏 O(n)"""
+        group = self._groups.get((court_id, day))
+        if not group:
+            return []
+        items, starts, max_ends = group
+        found = []
+        i = bisect.bisect_left(starts, end) - 1
+        while i >= 0 and max_ends[i] > start:
+            if items[i].end > start:
+                found.append(items[i])
+            i -= 1
+        found.reverse()
+        return found
+
+
+def check(proposals, index=None):
+    """
+    检查拟新建的时间段 [(场地ID, 日期, 开始时间, 结束时间)]，返回 (可写入的序号, 跳过的序号, 冲突列表)。
+    与数据库中的时间段完全相同、或与排在前面的拟新建时间段完全相同的跳过；
+    与场次模板的场次完全相同的视为写入该场次，可以写入；其余任何重叠均为冲突
+    """
+    if index is None:
+        index = IntervalIndex.load({proposal[:2] for proposal in proposals})
+
+    accepted, skipped, conflicts = [], [], []
+    order = sorted(range(len(proposals)), key=lambda i: proposals[i])
+    for (court_id, day), group in groupby(order, key=lambda i: proposals[i][:2]):
+        active = []   # 组内已扫描且尚未结束的拟新建时间段 (结束时间, 序号)
+        previous = None
+        for i in group:
+            start, end = proposals[i][2:]
+            if (start, end) == previous:
+                skipped.append(i)
+                continue
+            previous = (start, end)
+
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            existing = index.overlapping(court_id, day, start, end)
+            exact = [item for item in existing if (item.start, item.end) == (start, end)]
+            others = [item for item in existing if (item.start, item.end) != (start, end)]
+            proposed = sorted(j for _, j in active)
+            heapq.heappush(active, (end, i))
+
+            if others or proposed:
+                conflicts.append(Conflict(i, others, proposed))
+            elif any(isinstance(item.slot_id, int) for item in exact):
+                skipped.append(i)
+            else:
+                accepted.append(i)
+
+    conflicts.sort(key=lambda conflict: conflict.index)
+    return sorted(accepted), sorted(skipped), conflicts
@@ -0,0 +1,71 @@
+"""
+数据库结构升级
+db.create_all() 只会创建缺失的表，已有数据库文件中新增的列和索引在这里补齐。
+新增唯一索引前先检查重复数据：可以安全合并的（如周统计）先合并，其余跳过该索引并记录错误，待人工处理
+"""
+
+from sqlalchemy import inspect, func, select
+from sqlalchemy.schema import CreateColumn
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def has_duplicates(conn, index):
+    """唯一索引的列上是否已存在重复数据"""
+    columns = list(index.columns)
+    duplicates = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+    return conn.execute(select(func.count()).select_from(duplicates)).scalar() > 0
+
+
+def merge_weekly_stats(conn, table):
+    """合并同一学生同一周的重复周统计：预约次数累加到ID最小的一条，删除其余记录"""
+    other = table.alias('other')
+    keep_ids = select(func.min(table.c.id)).group_by(table.c.student_id, table.c.week_start)
+    total = select(func.sum(func.coalesce(other.c.reservations_count, 0))).where(
+        other.c.student_id == table.c.student_id,
+        other.c.week_start == table.c.week_start
+    ).scalar_subquery()
+    conn.execute(table.update().where(table.c.id.in_(keep_ids)).values(reservations_count=total))
+    deleted = conn.execute(table.delete().where(table.c.id.not_in(keep_ids))).rowcount
+    logger.info(f"数据库升级: 合并 {deleted} 条重复的周统计记录")
+
+
+# 新增唯一索引前可以自动合并重复数据的表
+DEDUPLICATORS = {
+    'weekly_stats': merge_weekly_stats,
+}
+
+
+def upgrade_schema(db):
+    """为已存在的表补齐模型中新增的列和索引"""
+    engine = db.engine
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            # 新增列必须允许为空，旧数据行保持NULL
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+                logger.info(f"数据库升级: {table.name} 新增列 {column.name}")
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique and has_duplicates(conn, index):
+                    deduplicate = DEDUPLICATORS.get(table.name)
+                    if deduplicate is None:
+                        logger.error(f"数据库升级: {table.name} 存在重复数据，跳过唯一索引 {index.name}")
+                        continue
+                    deduplicate(conn, table)
+                index.create(conn)
+                logger.info(f"数据库升级: {table.name} 新增索引 {index.name}")
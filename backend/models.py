@@ -1,10 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta
 from enum import Enum
-import bcrypt
+import random
+import passwords
 
 db = SQLAlchemy()
 
+# 权重下限，权重为0的申请者仍可参与抽签，且不会出现除零
+MIN_PRIORITY_WEIGHT = 1e-6
+
+# 优先级权重 = (1 - 成功率) * 信用分 / 100，新用户成功率按0.5计算
+PRIORITY_WEIGHT_SQL = (
+    "(1.0 - CASE WHEN coalesce(total_applications, 0) = 0 THEN 0.5 "
+    "ELSE 1.0 * coalesce(successful_applications, 0) / total_applications END) "
+    "* coalesce(credit_score, 100) / 100.0"
+)
+
+def dialect_insert(table):
+    """按数据库方言构造支持 ON CONFLICT 的 INSERT（SQLite / PostgreSQL）"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
 class ApplicationStatus(Enum):
     PENDING = "pending"      # 待分配
     APPROVED = "approved"    # 已分配
@@ -28,6 +45,9 @@ class Student(db.Model):
     successful_applications = db.Column(db.Integer, default=0)  # 成功申请次数
     no_show_count = db.Column(db.Integer, default=0)  # 爽约次数
     
+    # 优先级权重由数据库根据信用分和申请次数自动计算并建立索引，与 get_priority_weight() 公式一致
+    priority_weight = db.Column(db.Float, db.Computed(PRIORITY_WEIGHT_SQL), index=True)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关系
@@ -35,10 +55,11 @@ class Student(db.Model):
     reservations = db.relationship('Reservation', backref='student', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # 在哈希线程池中执行，工作因子取自 BCRYPT_ROUNDS
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return passwords.verify_password(password, self.password_hash)
     
     def get_success_rate(self):
         if self.total_applications == 0:
@@ -78,6 +99,11 @@ class TimeSlot(db.Model):
     # 关系
     applications = db.relationship('Application', backref='time_slot', lazy=True)
     reservations = db.relationship('Reservation', backref='time_slot', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_time_slots_date_court_start', 'date', 'court_id', 'start_time'),
+        db.Index('uq_time_slots_court_date_time', 'court_id', 'date', 'start_time', 'end_time', unique=True),
+    )
 
 class Application(db.Model):
     __tablename__ = 'applications'
@@ -93,6 +119,23 @@ class Application(db.Model):
     
     # 候补队列相关
     queue_position = db.Column(db.Integer)  # 队列位置
+    
+    # 抽签状态：提交申请时即抽取，夜间分配只需读取每个时间段键值最小的申请
+    lottery_ticket = db.Column(db.Float)  # 指数分布随机数
+    lottery_key = db.Column(db.Float)     # 抽签键 = 彩票 / 权重，越小越优先
+    
+    # (time_slot_id, status) 的查询由以下两个索引的前缀覆盖
+    __table_args__ = (
+        db.Index('ix_applications_slot_status_lottery', 'time_slot_id', 'status', 'lottery_key'),
+        db.Index('ix_applications_slot_status_queue', 'time_slot_id', 'status', 'queue_position'),
+        db.Index('ix_applications_status', 'status'),
+        db.Index('uq_applications_student_slot', 'student_id', 'time_slot_id', unique=True),
+    )
+    
+    def draw_lottery(self, weight):
+        """抽取彩票并计算抽签键，每个时间段键值最小者中签的概率与权重成正比"""
+        self.lottery_ticket = random.expovariate(1.0)
+        self.lottery_key = self.lottery_ticket / max(weight, MIN_PRIORITY_WEIGHT)
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
@@ -114,6 +157,12 @@ class Reservation(db.Model):
     # 评分反馈
     rating = db.Column(db.Integer)  # 1-5分评分
     feedback = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_reservations_slot_cancelled', 'time_slot_id', 'is_cancelled'),
+        db.Index('ix_reservations_application', 'application_id'),
+        db.Index('ix_reservations_student_created', 'student_id', 'created_at'),
+    )
 
 class WeeklyStats(db.Model):
     __tablename__ = 'weekly_stats'
@@ -124,6 +173,10 @@ class WeeklyStats(db.Model):
     reservations_count = db.Column(db.Integer, default=0)  # 本周预约次数
     
     student = db.relationship('Student', backref='weekly_stats')
+    
+    __table_args__ = (
+        db.Index('uq_weekly_stats_student_week', 'student_id', 'week_start', unique=True),
+    )
 
 class SystemConfig(db.Model):
     __tablename__ = 'system_config'
@@ -131,4 +184,84 @@ class SystemConfig(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(50), unique=True, nullable=False)
     value = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text) 
\ No newline at end of file
+    description = db.Column(db.Text)
+
+class AllocationRun(db.Model):
+    """公平分配执行记录，按时间段分块提交，中断后从检查点继续"""
+    __tablename__ = 'allocation_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='running', index=True)  # running / completed
+    max_application_id = db.Column(db.Integer, nullable=False)  # 本次分配的申请快照上限
+    last_slot_id = db.Column(db.Integer, default=0)  # 已提交的最后一个时间段ID
+    
+    allocated_count = db.Column(db.Integer, default=0)
+    rejected_count = db.Column(db.Integer, default=0)
+    failed_slots = db.Column(db.Integer, default=0)  # 写入失败、留待下次分配的时间段数
+    
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class CancellationEvent(db.Model):
+    """取消预约事件（发件箱），由候补队列处理器消费并递补下一位候补者"""
+    __tablename__ = 'cancellation_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'), nullable=False)
+    time_slot_id = db.Column(db.Integer, db.ForeignKey('time_slots.id'), nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, index=True)  # 为空表示尚未处理
+    error = db.Column(db.Text)  # 处理失败的原因，失败事件不再重试
+
+class JobWatermark(db.Model):
+    """调度任务水位线，记录每个按天处理的任务已处理到的日期"""
+    __tablename__ = 'job_watermarks'
+    
+    job_name = db.Column(db.String(50), primary_key=True)
+    last_date = db.Column(db.Date, nullable=False)  # 该日期及之前的数据已处理
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SlotBoard(db.Model):
+    """时间段看板（读模型），保存每个时间段的状态、申请统计和预约人摘要，写操作提交时增量刷新"""
+    __tablename__ = 'slot_board'
+    
+    time_slot_id = db.Column(db.Integer, db.ForeignKey('time_slots.id'), primary_key=True)
+    court_id = db.Column(db.Integer, db.ForeignKey('courts.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    is_available = db.Column(db.Boolean, default=True)
+    
+    pending_count = db.Column(db.Integer, default=0)
+    approved_count = db.Column(db.Integer, default=0)
+    
+    # 有效预约的预约人摘要，未被预约时为空
+    is_reserved = db.Column(db.Boolean, default=False)
+    reserver_name = db.Column(db.String(50))
+    reserver_student_id = db.Column(db.String(20))
+    reserved_at = db.Column(db.DateTime)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_slot_board_date_start', 'date', 'start_time'),
+    )
+
+class SlotTemplate(db.Model):
+    """场次模板：场地每周固定的场次规则，在生效日期范围内按星期展开为时间段"""
+    __tablename__ = 'slot_templates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    court_id = db.Column(db.Integer, db.ForeignKey('courts.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0-6，周一为0
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    
+    start_date = db.Column(db.Date, nullable=False)  # 生效日期范围（含首尾），结束日期为空表示长期有效
+    end_date = db.Column(db.Date)
+    exception_dates = db.Column(db.JSON, default=list)  # 不生成时间段的日期（ISO格式字符串）
+    is_active = db.Column(db.Boolean, default=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
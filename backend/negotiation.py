@@ -0,0 +1,53 @@
+"""
+响应内容协商
+- 格式：Accept 包含 application/msgpack 时以MessagePack序列化，否则为JSON
+- 压缩：Accept-Encoding 支持时优先brotli，其次gzip；响应体小于 COMPRESS_MIN_SIZE 时不压缩
+msgpack 和 brotli 为可选依赖，未安装时不参与协商
+"""
+
+import gzip
+from flask import current_app, request, json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+
+def choose_media_type():
+    """按 Accept 选择响应格式"""
+    if msgpack is None:
+        return JSON
+    offered = [JSON, MSGPACK, 'application/x-msgpack']
+    best = request.accept_mimetypes.best_match(offered, default=JSON)
+    return JSON if best == JSON else MSGPACK
+
+
+def choose_encoding():
+    """按 Accept-Encoding 选择压缩方式，不压缩时返回None"""
+    offered = (['br'] if brotli is not None else []) + ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def serialize(payload, media_type):
+    """按响应格式序列化"""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload).encode('utf-8')
+
+
+def compress(body, encoding):
+    """压缩响应体，返回 (响应体, 实际使用的压缩方式)"""
+    if encoding is None or len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body), 'br'
+    return gzip.compress(body, compresslevel=6), 'gzip'
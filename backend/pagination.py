@@ -0,0 +1,85 @@
+"""
+列表接口的分页与流式输出
+- 键集分页：limit 指定每页条数，cursor 为上一页返回的 next_cursor，按排序键继续读取，
+  每页的查询代价与页码无关
+- 流式输出：stream=1 时用服务端游标（yield_per）分批读取，边读边输出JSON，内存占用不随结果集增长
+不带这些参数时接口返回完整列表，与原有行为一致
+"""
+
+import base64
+from datetime import date, time, datetime
+from flask import current_app, request, json, stream_with_context
+from sqlalchemy import tuple_
+
+
+def page_args():
+    """解析 limit、cursor、stream 参数，返回 (limit, cursor, stream)；参数无效时抛出ValueError"""
+    limit = request.args.get('limit')
+    if limit is not None:
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError('limit必须是正整数')
+        limit = min(limit, current_app.config['PAGE_SIZE_MAX'])
+    cursor = request.args.get('cursor') or None
+    stream = request.args.get('stream') in ('1', 'true')
+    return limit, cursor, stream
+
+
+def encode_cursor(values):
+    """把排序键编码为游标字符串"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, time)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, columns):
+    """按排序列的类型还原游标中的排序键"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('cursor无效')
+    if not isinstance(raw, list) or len(raw) != len(columns):
+        raise ValueError('cursor无效')
+
+    values = []
+    for value, column in zip(raw, columns):
+        python_type = column.type.python_type
+        if python_type in (date, time, datetime):
+            value = python_type.fromisoformat(value)
+        values.append(value)
+    return values
+
+
+def paginate(query, columns, key, limit, cursor, descending=False):
+    """
+    按排序列做键集分页，返回 (本页数据行, 下一页游标)；没有下一页时游标为None。
+    key 从数据行中取出排序键，排序列最后一列须唯一（通常为主键）
+    """
+    if cursor:
+        bound = tuple_(*decode_cursor(cursor, columns))
+        query = query.filter(tuple_(*columns) < bound if descending else tuple_(*columns) > bound)
+    query = query.order_by(*[c.desc() for c in columns] if descending else columns)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def stream_json(name, query, serialize, extra=None):
+    """
+    以服务端游标分批读取查询结果，逐条输出 {name: [...], **extra} 形式的JSON响应；
+    query 也可以是已排好序的数据行迭代器（如多个来源归并后的结果）。extra 在列表输出完毕后生成
+    """
+    rows = query.yield_per(current_app.config['STREAM_BATCH_SIZE']) if hasattr(query, 'yield_per') else query
+
+    def generate():
+        yield '{' + json.dumps(name) + ':['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + json.dumps(serialize(row))
+        yield ']'
+        for field, value in (extra() if extra else {}).items():
+            yield ',' + json.dumps(field) + ':' + json.dumps(value)
+        yield '}'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
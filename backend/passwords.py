@@ -0,0 +1,88 @@
+"""
+密码哈希服务
+bcrypt 计算时释放GIL，放入进程内固定大小的线程池执行，同时进行的哈希数不超过 PASSWORD_HASH_WORKERS（默认CPU核数），
+登录高峰时不会让每个请求线程各自占满一个核。排队与执行中的任务合计不超过 PASSWORD_HASH_QUEUE，
+超出时最多等待 PASSWORD_HASH_TIMEOUT 秒，仍无空位则抛出 HashingBusy，由接口返回503，请求不会无限堆积。
+工作因子取自 BCRYPT_ROUNDS，登录成功时若已存的哈希工作因子与配置不同则重新哈希（见 needs_rehash）。
+线程池在首次使用时按当时的配置创建，多进程部署时各进程独立维护
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+
+_lock = threading.Lock()
+_executor = None
+_slots = None    # 排队与执行中的任务名额
+
+
+class HashingBusy(Exception):
+    """哈希任务已满，调用方应稍后重试"""
+
+
+def _pool():
+    """线程池及任务名额，首次使用时创建"""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = current_app.config['PASSWORD_HASH_WORKERS'] or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(max(workers, current_app.config['PASSWORD_HASH_QUEUE']))
+        return _executor, _slots
+
+
+def _run(func, *args):
+    """在线程池中执行并等待结果，没有空余名额时抛出 HashingBusy"""
+    executor, slots = _pool()
+    if not slots.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+        raise HashingBusy()
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+
+def rounds():
+    """配置的bcrypt工作因子"""
+    return current_app.config['BCRYPT_ROUNDS']
+
+
+def hash_password(password):
+    """按配置的工作因子哈希密码"""
+    salt = bcrypt.gensalt(rounds())
+    return _run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    """校验密码；哈希格式无效时返回False"""
+    try:
+        return _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_rounds(password_hash):
+    """已存哈希的工作因子（$2b$12$... 中的12），格式无效时返回None"""
+    parts = password_hash.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(password_hash):
+    """已存哈希的工作因子与配置不同时需要重新哈希"""
+    return hash_rounds(password_hash) != rounds()
+
+
+def shutdown():
+    """关闭线程池（等待已提交的任务），之后再次使用时按当前配置重新创建"""
+    global _executor, _slots
+    with _lock:
+        executor, _executor, _slots = _executor, None, None
+    if executor is not None:
+        executor.shutdown(wait=True)
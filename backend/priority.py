@@ -0,0 +1,37 @@
+"""
+优先级权重维护
+学生的优先级权重由数据库计算列 students.priority_weight 实时给出；
+信用分、申请次数或成功次数变化后，调用 refresh_pending_weights 同步该学生待处理申请的权重和抽签键，
+保证夜间分配读取的抽签键始终基于最新权重
+"""
+
+from sqlalchemy import case, select
+from models import db, Application, Student, ApplicationStatus, MIN_PRIORITY_WEIGHT
+
+
+def refresh_pending_weights(student_ids):
+    """以一条语句更新指定学生所有待处理申请的权重和抽签键（不提交事务）"""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+
+    applications = Application.__table__
+    students = Student.__table__
+    current_weight = select(students.c.priority_weight).where(
+        students.c.id == applications.c.student_id
+    ).scalar_subquery()
+
+    for i in range(0, len(student_ids), 500):
+        db.session.execute(
+            applications.update().where(
+                applications.c.status == ApplicationStatus.PENDING,
+                applications.c.student_id.in_(student_ids[i:i + 500]),
+                applications.c.lottery_ticket.isnot(None)
+            ).values(
+                priority_weight=current_weight,
+                lottery_key=applications.c.lottery_ticket / case(
+                    (current_weight > MIN_PRIORITY_WEIGHT, current_weight),
+                    else_=MIN_PRIORITY_WEIGHT
+                )
+            )
+        )
@@ -0,0 +1,139 @@
+"""
+每周预约次数配额
+统计记录按 (student_id, week_start) 唯一，所有写入都是一条 INSERT ... ON CONFLICT DO UPDATE：
+- consume: 次数未达 MAX_WEEKLY_RESERVATIONS 时加一，已达上限时冲突分支的条件不成立，不返回任何行
+- release: 次数大于0时减一
+- add: 夜间分配批量累加（每个学生的中签数已在分配时限制在本周剩余次数内，见 remaining）
+并发请求由数据库在同一条语句中完成判断和累加，不会超出上限，也不会产生重复的统计记录。
+读取已用次数的接口（提交申请、直接预约前的预检）使用进程内缓存，写入提交后清除对应条目（见 changes.py），
+条目最长保留 QUOTA_CACHE_TTL 秒，多进程部署时其他进程的写入最迟在此之后可见；缓存只用于提前拒绝，最终以 consume 为准
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import select, func
+from models import db, WeeklyStats, dialect_insert
+
+CHANGED_QUOTAS_KEY = 'changed_quotas'
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # (学生ID, 周开始日期) -> (已用次数, 读取时间)
+
+
+def week_start(day=None):
+    """所在周的周一"""
+    day = day or date.today()
+    return day - timedelta(days=day.weekday())
+
+
+def _changed(student_ids):
+    """登记当前事务中配额发生变化的学生，提交后清除其缓存"""
+    db.session.info.setdefault(CHANGED_QUOTAS_KEY, set()).update(student_ids)
+
+
+def used(student_id):
+    """本周已用的预约次数（读缓存）"""
+    key = (int(student_id), week_start())
+    ttl = current_app.config['QUOTA_CACHE_TTL']
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < ttl:
+            _entries.move_to_end(key)
+            return entry[0]
+
+    stats = WeeklyStats.__table__
+    count = db.session.execute(
+        select(func.coalesce(stats.c.reservations_count, 0)).where(
+            stats.c.student_id == key[0],
+            stats.c.week_start == key[1]
+        )
+    ).scalar() or 0
+
+    with _lock:
+        _entries[key] = (count, time.monotonic())
+        _entries.move_to_end(key)
+        while len(_entries) > current_app.config['QUOTA_CACHE_SIZE']:
+            _entries.popitem(last=False)
+    return count
+
+
+def has_quota(student_id):
+    """本周是否还能预约（读缓存）"""
+    return used(student_id) < current_app.config['MAX_WEEKLY_RESERVATIONS']
+
+
+def consume(student_id):
+    """占用一次本周配额，成功时返回占用后的次数，已达上限时返回None"""
+    limit = current_app.config['MAX_WEEKLY_RESERVATIONS']
+    if limit <= 0:
+        return None
+    stats = WeeklyStats.__table__
+    statement = dialect_insert(stats).values(student_id=student_id, week_start=week_start(), reservations_count=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[stats.c.student_id, stats.c.week_start],
+        set_={'reservations_count': func.coalesce(stats.c.reservations_count, 0) + 1},
+        where=func.coalesce(stats.c.reservations_count, 0) < limit
+    ).returning(stats.c.reservations_count)
+    count = db.session.execute(statement).scalar()
+    if count is not None:
+        _changed([student_id])
+    return count
+
+
+def release(student_id):
+    """归还一次本周配额"""
+    stats = WeeklyStats.__table__
+    db.session.execute(
+        stats.update().where(
+            stats.c.student_id == student_id,
+            stats.c.week_start == week_start(),
+            stats.c.reservations_count > 0
+        ).values(reservations_count=stats.c.reservations_count - 1)
+    )
+    _changed([student_id])
+
+
+def add(counts):
+    """批量累加本周预约次数 {学生ID: 次数}，不存在的统计记录同时创建"""
+    if not counts:
+        return
+    stats = WeeklyStats.__table__
+    statement = dialect_insert(stats)
+    statement = statement.on_conflict_do_update(
+        index_elements=[stats.c.student_id, stats.c.week_start],
+        set_={'reservations_count': func.coalesce(stats.c.reservations_count, 0) + statement.excluded.reservations_count}
+    )
+    current_week = week_start()
+    db.session.execute(statement, [
+        {'student_id': student_id, 'week_start': current_week, 'reservations_count': count}
+        for student_id, count in counts.items()
+    ])
+    _changed(counts)
+
+
+def remaining(student_ids):
+    """这些学生本周剩余的预约次数 {学生ID: 次数}，直接读数据库（不经缓存），每500个学生一条查询"""
+    student_ids = sorted(set(student_ids))
+    stats = WeeklyStats.__table__
+    current_week = week_start()
+    used_counts = {}
+    for i in range(0, len(student_ids), 500):
+        used_counts.update(db.session.execute(
+            select(stats.c.student_id, func.coalesce(stats.c.reservations_count, 0)).where(
+                stats.c.student_id.in_(student_ids[i:i + 500]),
+                stats.c.week_start == current_week
+            )
+        ).all())
+    limit = current_app.config['MAX_WEEKLY_RESERVATIONS']
+    return {student_id: max(0, limit - used_counts.get(student_id, 0)) for student_id in student_ids}
+
+
+def invalidate(student_ids):
+    """清除这些学生本周配额的缓存"""
+    current_week = week_start()
+    with _lock:
+        for student_id in student_ids:
+            _entries.pop((int(student_id), current_week), None)
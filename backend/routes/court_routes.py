@@ -1,47 +1,66 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, json
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Court, TimeSlot, Application, Reservation, ApplicationStatus
+from models import db, TimeSlot, Application, Reservation, SlotBoard, SlotTemplate, ApplicationStatus
+from changes import slots_changed
+import schedules
+import intervals
+import template_registry
+from cache import cached_response
+from board import slot_status
+import events
+import court_registry
+from pagination import page_args, paginate, stream_json, decode_cursor, encode_cursor
 from datetime import datetime, date, time, timedelta
-from sqlalchemy import and_, or_
+import heapq
+from sqlalchemy import func
 
 court_bp = Blueprint('court', __name__)
 
 @court_bp.route('/courts', methods=['GET'])
 def get_all_courts():
-    """获取所有启用的场地信息"""
-    courts = Court.query.filter_by(is_active=True).all()
+    """获取所有启用的场地信息（从场地注册表读取，不访问数据库）"""
+    etag = court_registry.etag()
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({'courts': court_registry.active_courts()})
     
-    result = []
-    for court in courts:
-        result.append({
-            'id': court.id,
-            'name': court.name,
-            'location': court.location,
-            'capacity': court.capacity,
-            'is_active': court.is_active
-        })
-    
-    return jsonify({'courts': result}), 200
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"max-age={current_app.config['COURTS_MAX_AGE']}"
+    return response
 
 @court_bp.route('/timeslots/available', methods=['GET'])
 def get_available_timeslots():
-    """查询可申请的场次"""
+    """
+    查询可申请的场次，支持 limit/cursor 分页和 stream=1 流式输出；
+    format=columnar 时以列式格式返回，场地信息只在场地表中出现一次
+    """
     # 获取查询参数
     date_str = request.args.get('date')
     court_id = request.args.get('court_id')
     
-    # 构建查询条件
-    query = db.session.query(TimeSlot, Court).join(
-        Court, TimeSlot.court_id == Court.id
-    ).filter(
-        Court.is_active == True
-    )
+    try:
+        limit, cursor, stream = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response_format = request.args.get('format', 'rows')
+    if response_format not in ('rows', 'columnar'):
+        return jsonify({'error': 'format只能是rows或columnar'}), 400
+    columnar = response_format == 'columnar'
+    if columnar and stream:
+        return jsonify({'error': '流式输出不支持columnar格式'}), 400
+    
+    # 构建时间段过滤条件，只显示未来的时间段
+    today = date.today()
+    conditions = [TimeSlot.court_id.in_(court_registry.active_ids()), TimeSlot.date >= today]
+    query_date = None
     
     # 如果指定了日期
     if date_str:
         try:
             query_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            query = query.filter(TimeSlot.date == query_date)
+            conditions.append(TimeSlot.date == query_date)
         except ValueError:
             return jsonify({'error': '日期格式错误，请使用YYYY-MM-DD格式'}), 400
     
@@ -49,55 +68,150 @@ def get_available_timeslots():
     if court_id:
         try:
             court_id = int(court_id)
-            query = query.filter(TimeSlot.court_id == court_id)
+            conditions.append(TimeSlot.court_id == court_id)
         except ValueError:
             return jsonify({'error': '场地ID必须是数字'}), 400
     
-    # 只显示未来的时间段
-    today = date.today()
-    query = query.filter(TimeSlot.date >= today)
+    if stream:
+        # 数据库中的时间段以服务端游标分批读取，与虚拟时间段按排序键归并后输出
+        rows = available_timeslots_query(conditions).order_by(*AVAILABLE_ORDER).yield_per(
+            current_app.config['STREAM_BATCH_SIZE']
+        )
+        virtual = virtual_timeslots(conditions, query_date, court_id)
+        return stream_json('timeslots', heapq.merge(rows, virtual, key=available_key), serialize_available_timeslot)
     
-    # 执行查询
-    timeslots = query.order_by(TimeSlot.date, TimeSlot.start_time).all()
+    # 结果只随所查日期的数据变化（不指定日期时随任一日期变化），并随“今天”滚动；
+    # 场地或场次模板变化后注册表版本号递增，缓存随之失效
+    return cached_response(
+        ('available', court_registry.version(), template_registry.version(), today, query_date, court_id,
+         limit, cursor, columnar), query_date,
+        lambda: build_available_timeslots(conditions, query_date, court_id, limit, cursor, columnar)
+    )
+
+# 可申请场次列表的排序键，同时用于键集分页；虚拟时间段没有整数ID，排序时以0代替
+AVAILABLE_ORDER = (TimeSlot.date, TimeSlot.start_time, TimeSlot.court_id, TimeSlot.end_time, TimeSlot.id)
+
+def available_key(row):
+    """数据行（数据库或虚拟时间段）的排序键"""
+    slot = row[0]
+    return (slot.date, slot.start_time, slot.court_id, slot.end_time, slot.id if isinstance(slot.id, int) else 0)
+
+def virtual_timeslots(conditions, query_date, court_id):
+    """
+    查询条件范围内尚未写入数据库的虚拟时间段，以 (时间段, 待处理申请数, 有效预约数) 形式返回，已排序。
+    已写入的场次以一条查询取出后跳过
+    """
+    first, last = schedules.horizon()
+    if query_date is not None:
+        if not first <= query_date <= last:
+            return []
+        first = last = query_date
+    existing = db.session.query(
+        TimeSlot.court_id, TimeSlot.date, TimeSlot.start_time, TimeSlot.end_time
+    ).filter(*conditions, TimeSlot.date.between(first, last))
+    slots = schedules.virtual_slots(first, last, court_id, existing=[tuple(row) for row in existing])
+    return [(slot, 0, 0) for slot in slots]
+
+def available_timeslots_query(conditions):
+    """可申请场次查询：待处理申请数与有效预约数以分组子查询统计，整个列表只需一条SQL"""
+    matching_slots = db.session.query(TimeSlot.id).filter(*conditions)
+    pending = db.session.query(
+        Application.time_slot_id,
+        func.count(Application.id).label('pending_count')
+    ).filter(
+        Application.status == ApplicationStatus.PENDING,
+        Application.time_slot_id.in_(matching_slots)
+    ).group_by(Application.time_slot_id).subquery()
+    reserved = db.session.query(
+        Reservation.time_slot_id,
+        func.count(Reservation.id).label('reservation_count')
+    ).filter(
+        Reservation.is_cancelled == False,
+        Reservation.time_slot_id.in_(matching_slots)
+    ).group_by(Reservation.time_slot_id).subquery()
     
-    result = []
-    for slot, court in timeslots:
-        # 检查是否有待处理的申请
-        pending_count = Application.query.filter_by(
-            time_slot_id=slot.id,
-            status=ApplicationStatus.PENDING
-        ).count()
-        
-        # 检查是否已被预约
-        reservation = Reservation.query.filter_by(
-            time_slot_id=slot.id,
-            is_cancelled=False
-        ).first()
-        
-        # 确定状态
-        if reservation or not slot.is_available:
-            status = 'reserved'
-        elif pending_count > 0:
-            status = 'has_applications'
-        else:
-            status = 'available'
-        
-        result.append({
-            'id': slot.id,
-            'court_id': court.id,
-            'court_name': court.name,
-            'court_location': court.location,
-            'court_capacity': court.capacity,
-            'date': slot.date.isoformat(),
-            'start_time': slot.start_time.strftime('%H:%M'),
-            'end_time': slot.end_time.strftime('%H:%M'),
-            'is_available': slot.is_available,
-            'status': status,
-            'applications_count': pending_count,
-            'created_at': slot.created_at.isoformat()
+    return db.session.query(
+        TimeSlot,
+        func.coalesce(pending.c.pending_count, 0),
+        func.coalesce(reserved.c.reservation_count, 0)
+    ).outerjoin(
+        pending, pending.c.time_slot_id == TimeSlot.id
+    ).outerjoin(
+        reserved, reserved.c.time_slot_id == TimeSlot.id
+    ).filter(*conditions)
+
+def serialize_available_timeslot(row):
+    """可申请场次列表中的一项，场地信息取自场地注册表"""
+    slot, pending_count, reservation_count = row
+    # 其他进程新建的场地可能尚未加载，查不到时场地信息为空
+    court = court_registry.get(slot.court_id) or {}
+    status = slot_status(slot.is_available, reservation_count > 0, pending_count)
+    
+    return {
+        'id': slot.id,
+        'court_id': slot.court_id,
+        'court_name': court.get('name'),
+        'court_location': court.get('location'),
+        'court_capacity': court.get('capacity'),
+        'date': slot.date.isoformat(),
+        'start_time': slot.start_time.strftime('%H:%M'),
+        'end_time': slot.end_time.strftime('%H:%M'),
+        'is_available': slot.is_available,
+        'status': status,
+        'applications_count': pending_count,
+        'created_at': slot.created_at.isoformat() if slot.created_at else None
+    }
+
+# 列式格式中每个时间段保留的字段，场地名称、位置和容量移入场地表
+COLUMNAR_FIELDS = (
+    'id', 'court_id', 'date', 'start_time', 'end_time', 'is_available',
+    'status', 'applications_count', 'created_at'
+)
+
+def to_columnar(timeslots):
+    """转换为列式格式：每个字段一个数组，场地信息去重后放入按场地ID索引的场地表"""
+    courts = {}
+    for item in timeslots:
+        courts.setdefault(str(item['court_id']), {
+            'name': item['court_name'],
+            'location': item['court_location'],
+            'capacity': item['court_capacity']
         })
+    return {
+        'courts': courts,
+        'count': len(timeslots),
+        'columns': {field: [item[field] for item in timeslots] for field in COLUMNAR_FIELDS}
+    }
+
+def build_available_timeslots(conditions, query_date=None, court_id=None, limit=None, cursor=None, columnar=False):
+    """
+    按过滤条件生成可申请场次列表（含虚拟时间段），指定limit时只生成一页并附带下一页游标。
+    分页时数据库中的时间段按键集读取一页，与游标之后的虚拟时间段合并后取前limit项
+    """
+    query = available_timeslots_query(conditions)
+    virtual = virtual_timeslots(conditions, query_date, court_id)
+    
+    if limit is None:
+        rows = list(heapq.merge(query.order_by(*AVAILABLE_ORDER).all(), virtual, key=available_key))
+    else:
+        try:
+            rows, next_cursor = paginate(query, AVAILABLE_ORDER, available_key, limit, cursor)
+            if cursor:
+                after = tuple(decode_cursor(cursor, AVAILABLE_ORDER))
+                virtual = [row for row in virtual if available_key(row) > after]
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        merged = list(heapq.merge(rows, virtual, key=available_key))
+        rows = merged[:limit]
+        if next_cursor is not None or len(merged) > limit:
+            next_cursor = encode_cursor(available_key(rows[-1]))
     
-    return jsonify({'timeslots': result}), 200
+    timeslots = [serialize_available_timeslot(row) for row in rows]
+    result = {'timeslots': to_columnar(timeslots) if columnar else timeslots}
+    if limit is not None:
+        result['next_cursor'] = next_cursor
+    return result, 200
 
 @court_bp.route('/timeslots/reserve_status', methods=['GET'])
 def get_reservation_status():
@@ -112,61 +226,122 @@ def get_reservation_status():
     except ValueError:
         return jsonify({'error': '日期格式错误，请使用YYYY-MM-DD格式'}), 400
     
-    # 获取该日期的所有时间段
-    timeslots = db.session.query(TimeSlot, Court).join(
-        Court, TimeSlot.court_id == Court.id
-    ).filter(
-        TimeSlot.date == query_date,
-        Court.is_active == True
-    ).order_by(TimeSlot.start_time).all()
+    return cached_response(
+        ('reserve_status', court_registry.version(), template_registry.version(), date.today(), query_date),
+        query_date,
+        lambda: build_reservation_status(query_date)
+    )
+
+def build_reservation_status(query_date):
+    """生成某天的预约状态"""
+    # 从时间段看板按日期读取，状态、统计与预约人摘要均已预先计算
+    rows = SlotBoard.query.filter(
+        SlotBoard.date == query_date,
+        SlotBoard.court_id.in_(court_registry.active_ids())
+    ).order_by(SlotBoard.start_time).all()
+    
+    # 尚未写入数据库的虚拟时间段没有申请和预约，与看板行一起按开始时间排序
+    virtual = schedules.virtual_slots(query_date, query_date, existing=[
+        (row.court_id, row.date, row.start_time, row.end_time) for row in rows
+    ])
+    rows = sorted(rows + [
+        SlotBoard(time_slot_id=slot.id, court_id=slot.court_id, date=slot.date, start_time=slot.start_time,
+                  end_time=slot.end_time, is_available=True, pending_count=0, approved_count=0, is_reserved=False)
+        for slot in virtual
+    ], key=lambda row: (row.start_time, row.court_id, row.end_time))
     
     result = []
-    for slot, court in timeslots:
-        # 获取该时间段的申请统计
-        pending_count = Application.query.filter_by(
-            time_slot_id=slot.id,
-            status=ApplicationStatus.PENDING
-        ).count()
-        
-        approved_count = Application.query.filter_by(
-            time_slot_id=slot.id,
-            status=ApplicationStatus.APPROVED
-        ).count()
-        
-        # 获取预约信息
-        reservation = Reservation.query.filter_by(
-            time_slot_id=slot.id,
-            is_cancelled=False
-        ).first()
-        
+    for row in rows:
+        court = court_registry.get(row.court_id) or {}
         slot_info = {
-            'id': slot.id,
-            'court_id': court.id,
-            'court_name': court.name,
-            'court_location': court.location,
-            'start_time': slot.start_time.strftime('%H:%M'),
-            'end_time': slot.end_time.strftime('%H:%M'),
-            'is_available': slot.is_available,
-            'pending_applications': pending_count,
-            'approved_applications': approved_count,
-            'is_reserved': reservation is not None,
+            'id': row.time_slot_id,
+            'court_id': row.court_id,
+            'court_name': court.get('name'),
+            'court_location': court.get('location'),
+            'start_time': row.start_time.strftime('%H:%M'),
+            'end_time': row.end_time.strftime('%H:%M'),
+            'is_available': row.is_available,
+            'pending_applications': row.pending_count,
+            'approved_applications': row.approved_count,
+            'is_reserved': row.is_reserved,
             'reservation_info': None
         }
         
-        if reservation:
-            from models import Student
-            student = Student.query.get(reservation.student_id)
+        if row.is_reserved:
             slot_info['reservation_info'] = {
-                'student_name': student.name if student else '未知',
-                'student_id': student.student_id if student else '未知',
-                'reserved_at': reservation.created_at.isoformat()
+                'student_name': row.reserver_name or '未知',
+                'student_id': row.reserver_student_id or '未知',
+                'reserved_at': row.reserved_at.isoformat()
             }
         
         result.append(slot_info)
     
-    return jsonify({
+    return {
         'date': query_date.isoformat(),
         'timeslots': result
+    }, 200
+
+@court_bp.route('/timeslots/events', methods=['GET'])
+def get_timeslot_events():
+    """
+    时间段状态变化推送：Accept 为 text/event-stream 时以SSE持续推送，否则为长轮询。
+    每个事件包含时间段ID、场地、日期、最新状态和待处理申请数；
+    客户端加载一次完整列表后按事件更新，断线重连时通过 Last-Event-ID 或 since 参数续读
+    """
+    date_str = request.args.get('date')
+    if date_str:
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': '日期格式错误，请使用YYYY-MM-DD格式'}), 400
+    
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since else events.last_event_id()
+    except ValueError:
+        return jsonify({'error': '事件序号必须是数字'}), 400
+    
+    def matches(payload):
+        return not date_str or payload['date'] == date_str
+    
+    if request.accept_mimetypes.best == 'text/event-stream':
+        heartbeat = current_app.config['EVENT_HEARTBEAT_SECONDS']
+        
+        def generate():
+            last_id = since
+            while True:
+                batch = events.wait_for_events(last_id, heartbeat)
+                if batch is None:
+                    # 落后太多或服务已重启，通知客户端重新加载完整列表
+                    last_id = events.last_event_id()
+                    yield f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+                elif not batch:
+                    yield ': keepalive\n\n'
+                for event_id, payload in batch or []:
+                    last_id = event_id
+                    if matches(payload):
+                        yield f'id: {event_id}\nevent: slot\ndata: {json.dumps(payload)}\n\n'
+        
+        return current_app.response_class(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    # 长轮询：有新事件立即返回，否则最多等待 timeout 秒
+    try:
+        timeout = float(request.args.get('timeout', current_app.config['LONG_POLL_TIMEOUT']))
+    except ValueError:
+        return jsonify({'error': 'timeout必须是数字'}), 400
+    timeout = max(0, min(timeout, current_app.config['LONG_POLL_TIMEOUT']))
+    
+    batch = events.wait_for_events(since, timeout)
+    if batch is None:
+        return jsonify({'events': [], 'last_event_id': events.last_event_id(), 'reset': True}), 200
+    
+    return jsonify({
+        'events': [dict(payload, id=event_id) for event_id, payload in batch if matches(payload)],
+        'last_event_id': batch[-1][0] if batch else since,
+        'reset': False
     }), 200
 
 # 管理员功能：创建时间段
@@ -182,8 +357,8 @@ def create_timeslots():
             return jsonify({'error': f'缺少必填字段: {field}'}), 400
     
     # 验证场地是否存在
-    court = Court.query.get(data['court_id'])
-    if not court:
+    court = court_registry.get(data['court_id'])
+    if court is None:
         return jsonify({'error': '场地不存在'}), 404
     
     try:
@@ -196,31 +371,28 @@ def create_timeslots():
         if start_time >= end_time:
             return jsonify({'error': '开始时间必须早于结束时间'}), 400
         
-        # 检查时间段是否冲突
-        existing_slot = TimeSlot.query.filter(
-            and_(
-                TimeSlot.court_id == data['court_id'],
-                TimeSlot.date == slot_date,
-                or_(
-                    and_(TimeSlot.start_time <= start_time, TimeSlot.end_time > start_time),
-                    and_(TimeSlot.start_time < end_time, TimeSlot.end_time >= end_time),
-                    and_(TimeSlot.start_time >= start_time, TimeSlot.end_time <= end_time)
-                )
-            )
-        ).first()
-        
-        if existing_slot:
-            return jsonify({'error': '该时间段与现有时间段冲突'}), 400
+        # 检查时间段是否冲突（含场次模板的场次）
+        proposal = (court['id'], slot_date, start_time, end_time)
+        accepted, skipped, conflicts = intervals.check([proposal])
+        if skipped:
+            return jsonify({'error': '该时间段已存在'}), 400
+        if conflicts:
+            return jsonify({
+                'error': '该时间段与现有时间段冲突',
+                'conflicts': [serialize_conflict([proposal], conflict) for conflict in conflicts]
+            }), 400
         
         # 创建新时间段
         new_slot = TimeSlot(
-            court_id=data['court_id'],
+            court_id=court['id'],
             date=slot_date,
             start_time=start_time,
             end_time=end_time
         )
         
         db.session.add(new_slot)
+        db.session.flush()
+        slots_changed([new_slot.id])
         db.session.commit()
         
         return jsonify({
@@ -243,9 +415,10 @@ def batch_create_timeslots():
         if field not in data:
             return jsonify({'error': f'缺少必填字段: {field}'}), 400
     
-    court = Court.query.get(data['court_id'])
-    if not court:
+    court = court_registry.get(data['court_id'])
+    if court is None:
         return jsonify({'error': '场地不存在'}), 404
+    court_id = court['id']
     
     try:
         start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
@@ -254,44 +427,257 @@ def batch_create_timeslots():
         if start_date > end_date:
             return jsonify({'error': '开始日期不能晚于结束日期'}), 400
         
-        created_slots = []
-        current_date = start_date
+        times = [
+            (datetime.strptime(t['start_time'], '%H:%M').time(), datetime.strptime(t['end_time'], '%H:%M').time())
+            for t in data['time_slots']
+        ]
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
         
-        while current_date <= end_date:
-            for time_slot in data['time_slots']:
-                start_time = datetime.strptime(time_slot['start_time'], '%H:%M').time()
-                end_time = datetime.strptime(time_slot['end_time'], '%H:%M').time()
-                
-                # 检查是否已存在
-                existing = TimeSlot.query.filter_by(
-                    court_id=data['court_id'],
-                    date=current_date,
-                    start_time=start_time,
-                    end_time=end_time
-                ).first()
-                
-                if not existing:
-                    new_slot = TimeSlot(
-                        court_id=data['court_id'],
-                        date=current_date,
-                        start_time=start_time,
-                        end_time=end_time
-                    )
-                    db.session.add(new_slot)
-                    created_slots.append({
-                        'date': current_date.isoformat(),
-                        'start_time': start_time.strftime('%H:%M'),
-                        'end_time': end_time.strftime('%H:%M')
-                    })
-            
-            current_date += timedelta(days=1)
+        if any(start_time >= end_time for start_time, end_time in times):
+            return jsonify({'error': '开始时间必须早于结束时间'}), 400
+        
+        # 已存在的时间段跳过；与现有时间段或本批其他时间段重叠时一次列出全部冲突，不创建任何时间段
+        proposals = [(court_id, day, start_time, end_time) for day in days for start_time, end_time in times]
+        accepted, skipped, conflicts = intervals.check(proposals)
+        if conflicts:
+            return jsonify({
+                'error': f'有{len(conflicts)}个时间段与现有时间段冲突',
+                'conflicts': [serialize_conflict(proposals, conflict) for conflict in conflicts]
+            }), 400
         
+        created = schedules.insert_slots(proposals[i] for i in accepted)
         db.session.commit()
         
+        created_slots = [
+            {
+                'date': slot.date.isoformat(),
+                'start_time': slot.start_time.strftime('%H:%M'),
+                'end_time': slot.end_time.strftime('%H:%M')
+            }
+            for slot in sorted(created, key=lambda slot: (slot.date, slot.start_time))
+        ]
+        
         return jsonify({
             'message': f'成功创建{len(created_slots)}个时间段',
             'created_slots': created_slots
         }), 201
         
     except ValueError:
-        return jsonify({'error': '日期或时间格式错误'}), 400 
\ No newline at end of file
+        return jsonify({'error': '日期或时间格式错误'}), 400 
+
+def serialize_conflict(proposals, conflict):
+    """冲突报告中的一项：拟新建的时间段及与之重叠的已有时间段和本批其他时间段"""
+    court_id, slot_date, start_time, end_time = proposals[conflict.index]
+    return {
+        'index': conflict.index,
+        'court_id': court_id,
+        'date': slot_date.isoformat(),
+        'start_time': start_time.strftime('%H:%M'),
+        'end_time': end_time.strftime('%H:%M'),
+        'existing': [
+            {
+                'timeslot_id': item.slot_id,
+                'start_time': item.start.strftime('%H:%M'),
+                'end_time': item.end.strftime('%H:%M')
+            }
+            for item in conflict.existing
+        ],
+        'proposed': conflict.proposed
+    }
+
+@court_bp.route('/timeslots/import', methods=['POST'])
+@jwt_required()
+def import_timeslots():
+    """
+    导入时间段（管理员功能）：逐项校验格式和场地后，以区间索引一次检查全部重叠，
+    有任何错误或冲突时全部列出且不写入；dry_run 为真时只校验不写入。已存在的时间段跳过
+    """
+    data = request.get_json() or {}
+    items = data.get('slots')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'slots必须是非空数组'}), 400
+    max_items = current_app.config['TIMESLOT_IMPORT_MAX']
+    if len(items) > max_items:
+        return jsonify({'error': f'一次最多导入{max_items}个时间段'}), 400
+    
+    errors = []
+    proposals = []
+    positions = []   # 校验通过的时间段在请求中的序号
+    for position, item in enumerate(items):
+        try:
+            court = court_registry.get(item['court_id'])
+            proposal = (
+                court['id'] if court else None,
+                datetime.strptime(item['date'], '%Y-%m-%d').date(),
+                datetime.strptime(item['start_time'], '%H:%M').time(),
+                datetime.strptime(item['end_time'], '%H:%M').time()
+            )
+        except (KeyError, TypeError, ValueError):
+            errors.append({'index': position, 'error': '缺少字段或日期时间格式错误'})
+            continue
+        if court is None:
+            errors.append({'index': position, 'error': '场地不存在'})
+        elif proposal[2] >= proposal[3]:
+            errors.append({'index': position, 'error': '开始时间必须早于结束时间'})
+        else:
+            proposals.append(proposal)
+            positions.append(position)
+    
+    accepted, skipped, conflicts = intervals.check(proposals)
+    for conflict in conflicts:
+        report = serialize_conflict(proposals, conflict)
+        report['index'] = positions[conflict.index]
+        report['proposed'] = [positions[j] for j in conflict.proposed]
+        errors.append(report)
+    errors.sort(key=lambda error: error['index'])
+    
+    result = {
+        'total': len(items),
+        'accepted': len(accepted),
+        'skipped': [positions[i] for i in skipped],
+        'errors': errors
+    }
+    if errors:
+        result['error'] = f'有{len(errors)}个时间段无效或冲突，未导入任何时间段'
+        return jsonify(result), 400
+    if data.get('dry_run'):
+        return jsonify(result), 200
+    
+    created = schedules.insert_slots(proposals[i] for i in accepted)
+    db.session.commit()
+    result['created'] = len(created)
+    result['message'] = f'成功导入{len(created)}个时间段'
+    return jsonify(result), 201
+
+def serialize_template(template):
+    """场次模板"""
+    return {
+        'id': template.id,
+        'court_id': template.court_id,
+        'weekday': template.weekday,
+        'start_time': template.start_time.strftime('%H:%M'),
+        'end_time': template.end_time.strftime('%H:%M'),
+        'start_date': template.start_date.isoformat(),
+        'end_date': template.end_date.isoformat() if template.end_date else None,
+        'exception_dates': template.exception_dates or [],
+        'is_active': template.is_active
+    }
+
+# 场次模板
+@court_bp.route('/timeslots/templates', methods=['GET'])
+@jwt_required()
+def get_templates():
+    """查询场次模板，可按场地筛选"""
+    query = SlotTemplate.query.filter_by(is_active=True)
+    court_id = request.args.get('court_id')
+    if court_id:
+        query = query.filter_by(court_id=court_id)
+    templates = query.order_by(SlotTemplate.court_id, SlotTemplate.weekday, SlotTemplate.start_time).all()
+    return jsonify({'templates': [serialize_template(t) for t in templates]}), 200
+
+@court_bp.route('/timeslots/templates', methods=['POST'])
+@jwt_required()
+def create_templates():
+    """
+    创建场地每周固定的场次模板（管理员功能）：weekdays 中的每一天、time_slots 中的每个时段各生成一条模板。
+    end_date 为空表示长期有效，exception_dates 中的日期不生成时间段
+    """
+    data = request.get_json()
+    
+    required_fields = ['court_id', 'weekdays', 'time_slots', 'start_date']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'缺少必填字段: {field}'}), 400
+    
+    court = court_registry.get(data['court_id'])
+    if court is None:
+        return jsonify({'error': '场地不存在'}), 404
+    
+    try:
+        weekdays = sorted({int(w) for w in data['weekdays']})
+        if not weekdays or weekdays[0] < 0 or weekdays[-1] > 6:
+            return jsonify({'error': 'weekdays必须是0-6的整数（周一为0）'}), 400
+        
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+        if end_date and start_date > end_date:
+            return jsonify({'error': '开始日期不能晚于结束日期'}), 400
+        exception_dates = sorted({
+            datetime.strptime(d, '%Y-%m-%d').date().isoformat() for d in data.get('exception_dates') or []
+        })
+        
+        times = []
+        for time_slot in data['time_slots']:
+            start_time = datetime.strptime(time_slot['start_time'], '%H:%M').time()
+            end_time = datetime.strptime(time_slot['end_time'], '%H:%M').time()
+            if start_time >= end_time:
+                return jsonify({'error': '开始时间必须早于结束时间'}), 400
+            times.append((start_time, end_time))
+    except (ValueError, TypeError, KeyError):
+        return jsonify({'error': '日期或时间格式错误'}), 400
+    
+    templates = [
+        SlotTemplate(
+            court_id=court['id'],
+            weekday=weekday,
+            start_time=start_time,
+            end_time=end_time,
+            start_date=start_date,
+            end_date=end_date,
+            exception_dates=exception_dates
+        )
+        for weekday in weekdays for start_time, end_time in times
+    ]
+    db.session.add_all(templates)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'成功创建{len(templates)}个场次模板',
+        'templates': [serialize_template(t) for t in templates]
+    }), 201
+
+@court_bp.route('/timeslots/templates/<int:template_id>', methods=['DELETE'])
+@jwt_required()
+def delete_template(template_id):
+    """停用场次模板，已生成的时间段保留"""
+    template = SlotTemplate.query.get(template_id)
+    if not template or not template.is_active:
+        return jsonify({'error': '场次模板不存在'}), 404
+    
+    template.is_active = False
+    db.session.commit()
+    return jsonify({'message': '场次模板已停用'}), 200
+
+@court_bp.route('/timeslots/templates/generate', methods=['POST'])
+@jwt_required()
+def generate_from_templates():
+    """按启用的场次模板生成日期范围内的时间段，已存在的时间段跳过（管理员功能）"""
+    data = request.get_json()
+    
+    required_fields = ['start_date', 'end_date']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'缺少必填字段: {field}'}), 400
+    
+    court_id = data.get('court_id')
+    if court_id is not None:
+        court = court_registry.get(court_id)
+        if court is None:
+            return jsonify({'error': '场地不存在'}), 404
+        court_id = court['id']
+    
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': '日期格式错误'}), 400
+    if start_date > end_date:
+        return jsonify({'error': '开始日期不能晚于结束日期'}), 400
+    
+    created = schedules.generate_slots(start_date, end_date, court_id)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'成功创建{len(created)}个时间段',
+        'created_count': len(created)
+    }), 201
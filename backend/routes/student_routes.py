@@ -1,12 +1,27 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
-from models import db, Student, Application, Reservation, TimeSlot, Court, ApplicationStatus, WeeklyStats
-from datetime import datetime, date, timedelta
-from sqlalchemy import and_, or_
+from models import db, Student, Application, Reservation, TimeSlot, ApplicationStatus, CancellationEvent, MIN_PRIORITY_WEIGHT
+from priority import refresh_pending_weights
+from changes import slots_changed
+from pagination import page_args, paginate, stream_json
+import waitlist
+import passwords
+import quota
+import schedules
+import court_registry
+from datetime import datetime, date
+from sqlalchemy import and_, or_, update, exists, insert
+from sqlalchemy.exc import IntegrityError
 import random
 
 student_bp = Blueprint('student', __name__)
 
+def password_busy():
+    """密码哈希任务已满时的响应"""
+    response = jsonify({'error': '服务繁忙，请稍后重试'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @student_bp.route('/register', methods=['POST'])
 def register():
     """学生注册"""
@@ -32,7 +47,10 @@ def register():
         email=data['email'],
         phone=data.get('phone', '')
     )
-    student.set_password(data['password'])
+    try:
+        student.set_password(data['password'])
+    except passwords.HashingBusy:
+        return password_busy()
     
     db.session.add(student)
     db.session.commit()
@@ -49,7 +67,23 @@ def login():
     
     student = Student.query.filter_by(student_id=data['student_id']).first()
     
-    if student and student.check_password(data['password']):
+    try:
+        verified = student is not None and student.check_password(data['password'])
+    except passwords.HashingBusy:
+        return password_busy()
+    
+    if verified:
+        # 工作因子与配置不同时顺便重新哈希；失败不影响本次登录，下次登录再试
+        if passwords.needs_rehash(student.password_hash):
+            try:
+                student.set_password(data['password'])
+                db.session.commit()
+            except passwords.HashingBusy:
+                db.session.rollback()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"重新哈希密码失败: {e}")
+        
         access_token = create_access_token(identity=student.id)
         return jsonify({
             'token': access_token,
@@ -77,10 +111,11 @@ def apply_for_timeslot():
         if 'timeslot_id' not in data:
             return jsonify({'error': '缺少时间段ID'}), 400
         
-        time_slot_id = data['timeslot_id']
+        # 虚拟时间段在此写入数据库
+        time_slot_id = schedules.resolve_slot_id(data['timeslot_id'])
         
         # 检查时间段是否存在且可用
-        time_slot = TimeSlot.query.get(time_slot_id)
+        time_slot = TimeSlot.query.get(time_slot_id) if time_slot_id else None
         if not time_slot:
             return jsonify({'error': '时间段不存在'}), 404
         
@@ -100,34 +135,26 @@ def apply_for_timeslot():
         student = Student.query.get(student_id)
         if not student:
             return jsonify({'error': '学生不存在'}), 404
-            
-        week_start = date.today() - timedelta(days=date.today().weekday())
         
-        weekly_stat = WeeklyStats.query.filter_by(
-            student_id=student_id,
-            week_start=week_start
-        ).first()
-        
-        if not weekly_stat:
-            weekly_stat = WeeklyStats(student_id=student_id, week_start=week_start)
-            db.session.add(weekly_stat)
-        
-        # 确保reservations_count不为None
-        if weekly_stat.reservations_count is None:
-            weekly_stat.reservations_count = 0
-        
-        if weekly_stat.reservations_count >= 3:  # 每周最多3次
+        if not quota.has_quota(student_id):
             return jsonify({'error': '本周预约次数已达上限'}), 400
         
-        # 创建申请
+        # 创建申请，并在提交时完成抽签
+        priority_weight = student.priority_weight
         application = Application(
             student_id=student_id,
             time_slot_id=time_slot_id,
-            priority_weight=student.get_priority_weight()
+            priority_weight=priority_weight
         )
+        application.draw_lottery(priority_weight)
         
         db.session.add(application)
         student.total_applications += 1
+        db.session.flush()
+        
+        # 申请次数变化后权重随之变化，同步该学生所有待处理申请的抽签键
+        refresh_pending_weights([student.id])
+        slots_changed([application.time_slot_id])
         db.session.commit()
         
         return jsonify({
@@ -136,10 +163,119 @@ def apply_for_timeslot():
             'priority_weight': application.priority_weight
         }), 201
         
+    except IntegrityError:
+        # 并发重复提交时由唯一索引拦截
+        db.session.rollback()
+        return jsonify({'error': '您已经申请过该时间段'}), 400
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
 
+@student_bp.route('/apply_batch', methods=['POST'])
+@jwt_required()
+def apply_for_timeslots():
+    """
+    一次提交多个时间段的预约申请，逐项返回结果。
+    时间段是否存在与可用、是否已申请过各用一条IN查询批量检查，通过检查的申请以一条语句写入
+    """
+    student_id = get_jwt_identity()
+    data = request.get_json() or {}
+    
+    timeslot_ids = data.get('timeslot_ids')
+    if not isinstance(timeslot_ids, list) or not timeslot_ids:
+        return jsonify({'error': '缺少时间段ID列表'}), 400
+    if len(timeslot_ids) > current_app.config['BATCH_APPLY_MAX']:
+        return jsonify({'error': f"一次最多申请{current_app.config['BATCH_APPLY_MAX']}个时间段"}), 400
+    if not all(isinstance(t, (int, str)) and not isinstance(t, bool) for t in timeslot_ids):
+        return jsonify({'error': '时间段ID必须是整数或虚拟时间段ID'}), 400
+    
+    student = Student.query.get(student_id)
+    if not student:
+        return jsonify({'error': '学生不存在'}), 404
+    
+    # 虚拟时间段在此批量写入数据库，无效的ID对应None
+    resolved = dict(zip(timeslot_ids, schedules.resolve_slot_ids(timeslot_ids)))
+    requested = list(dict.fromkeys(t for t in resolved.values() if t is not None))
+    available = dict(db.session.query(TimeSlot.id, TimeSlot.is_available).filter(TimeSlot.id.in_(requested)))
+    applied = {t for (t,) in db.session.query(Application.time_slot_id).filter(
+        Application.student_id == student.id,
+        Application.time_slot_id.in_(requested)
+    )}
+    # 本周剩余次数，按请求顺序接受不超过该数量的申请
+    remaining = current_app.config['MAX_WEEKLY_RESERVATIONS'] - quota.used(student.id)
+    
+    # 逐项判断，与单个申请接口的检查顺序和提示一致
+    errors = {}
+    for time_slot_id in requested:
+        if time_slot_id not in available:
+            errors[time_slot_id] = '时间段不存在'
+        elif not available[time_slot_id]:
+            errors[time_slot_id] = '该时间段不可预约'
+        elif time_slot_id in applied:
+            errors[time_slot_id] = '您已经申请过该时间段'
+        elif remaining <= 0:
+            errors[time_slot_id] = '本周预约次数已达上限'
+        else:
+            remaining -= 1
+    accepted = [t for t in requested if t not in errors]
+    
+    created = {}
+    if accepted:
+        # 抽签方式同 Application.draw_lottery
+        priority_weight = student.priority_weight
+        rows = []
+        for time_slot_id in accepted:
+            ticket = random.expovariate(1.0)
+            rows.append({
+                'student_id': student.id,
+                'time_slot_id': time_slot_id,
+                'status': ApplicationStatus.PENDING,
+                'priority_weight': priority_weight,
+                'lottery_ticket': ticket,
+                'lottery_key': ticket / max(priority_weight, MIN_PRIORITY_WEIGHT)
+            })
+        try:
+            application_ids = db.session.scalars(
+                insert(Application).returning(Application.id, sort_by_parameter_order=True), rows
+            ).all()
+            student.total_applications = (student.total_applications or 0) + len(accepted)
+            db.session.flush()
+            refresh_pending_weights([student.id])
+            slots_changed(accepted)
+            db.session.commit()
+        except IntegrityError:
+            # 并发提交了相同的时间段，整批回滚
+            db.session.rollback()
+            return jsonify({'error': '部分时间段已经申请过，请刷新后重试'}), 400
+        created = dict(zip(accepted, application_ids))
+    
+    # 结果按请求中的ID逐项返回
+    results = []
+    seen = set()
+    for value in timeslot_ids:
+        time_slot_id = resolved[value]
+        item = {'timeslot_id': value, 'success': False}
+        if time_slot_id is None:
+            item['error'] = '时间段不存在'
+        elif time_slot_id in seen:
+            item['error'] = '重复的时间段ID'
+        elif time_slot_id in created:
+            item.update(success=True, application_id=created[time_slot_id])
+        else:
+            item['error'] = errors[time_slot_id]
+        if time_slot_id is not None:
+            seen.add(time_slot_id)
+        if item['success'] and value != time_slot_id:
+            item['resolved_timeslot_id'] = time_slot_id
+        results.append(item)
+    
+    return jsonify({
+        'message': f'成功提交{len(created)}个申请',
+        'created_count': len(created),
+        'results': results
+    }), 201 if created else 400
+
 @student_bp.route('/cancel', methods=['POST'])
 @jwt_required()
 def cancel_application():
@@ -176,19 +312,21 @@ def cancel_application():
             reservation.is_cancelled = True
             reservation.cancelled_at = datetime.utcnow()
             
-            # 更新周统计
-            week_start = date.today() - timedelta(days=date.today().weekday())
-            weekly_stat = WeeklyStats.query.filter_by(
-                student_id=student_id,
-                week_start=week_start
-            ).first()
-            if weekly_stat and weekly_stat.reservations_count > 0:
-                weekly_stat.reservations_count -= 1
+            # 在同一事务中写入取消事件，提交后由候补队列处理器立即递补
+            db.session.add(CancellationEvent(
+                reservation_id=reservation.id,
+                time_slot_id=reservation.time_slot_id
+            ))
+            
+            # 归还本周配额
+            quota.release(student_id)
     
     application.status = ApplicationStatus.CANCELLED
     application.processed_at = datetime.utcnow()
+    slots_changed([application.time_slot_id])
     
     db.session.commit()
+    waitlist.notify()
     
     return jsonify({'message': '取消成功'}), 200
 
@@ -202,53 +340,51 @@ def reserve_direct():
     if 'time_slot_id' not in data:
         return jsonify({'error': '缺少时间段ID'}), 400
     
-    time_slot_id = data['time_slot_id']
+    # 虚拟时间段在此写入数据库
+    time_slot_id = schedules.resolve_slot_id(data['time_slot_id'])
     
-    # 检查时间段是否存在且可用
-    time_slot = TimeSlot.query.get(time_slot_id)
+    time_slot = TimeSlot.query.get(time_slot_id) if time_slot_id else None
     if not time_slot:
         return jsonify({'error': '时间段不存在'}), 404
     
-    if not time_slot.is_available:
-        return jsonify({'error': '该时间段不可预约'}), 400
-    
-    # 检查是否有待处理的申请
-    pending_applications = Application.query.filter_by(
-        time_slot_id=time_slot_id,
-        status=ApplicationStatus.PENDING
-    ).count()
+    # 按缓存预检本周配额，已达上限时不必占用时间段
+    if not quota.has_quota(student_id):
+        return jsonify({'error': '本周预约次数已达上限'}), 400
     
-    if pending_applications > 0:
+    # 以一条条件UPDATE占用时间段：只有仍可预约且没有待处理申请时才会更新成功，
+    # 并发请求中只有一个能改到这一行，其余的影响行数为0，无需先读后写
+    claimed = db.session.execute(
+        update(TimeSlot).where(
+            TimeSlot.id == time_slot.id,
+            TimeSlot.is_available == True,
+            ~exists().where(
+                Application.time_slot_id == TimeSlot.id,
+                Application.status == ApplicationStatus.PENDING
+            )
+        ).values(is_available=False).execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if claimed != 1:
+        db.session.rollback()
+        time_slot = TimeSlot.query.get(time_slot_id)
+        if not time_slot:
+            return jsonify({'error': '时间段不存在'}), 404
+        if not time_slot.is_available:
+            return jsonify({'error': '该时间段不可预约'}), 400
         return jsonify({'error': '该时间段有待处理的申请，无法直接预约'}), 400
     
-    # 检查本周预约次数限制
-    week_start = date.today() - timedelta(days=date.today().weekday())
-    weekly_stat = WeeklyStats.query.filter_by(
-        student_id=student_id,
-        week_start=week_start
-    ).first()
-    
-    if not weekly_stat:
-        weekly_stat = WeeklyStats(student_id=student_id, week_start=week_start)
-        db.session.add(weekly_stat)
-    
-    # 确保reservations_count不为None
-    if weekly_stat.reservations_count is None:
-        weekly_stat.reservations_count = 0
-    
-    if weekly_stat.reservations_count >= 3:
+    # 配额在同一事务中原子地占用，超出上限时连同占用的时间段一起回滚
+    if quota.consume(student_id) is None:
+        db.session.rollback()
         return jsonify({'error': '本周预约次数已达上限'}), 400
     
     # 创建预约
     reservation = Reservation(
         student_id=student_id,
-        time_slot_id=time_slot_id
+        time_slot_id=time_slot.id
     )
-    
-    time_slot.is_available = False
-    weekly_stat.reservations_count += 1
-    
     db.session.add(reservation)
+    slots_changed([time_slot.id])
     db.session.commit()
     
     return jsonify({
@@ -259,101 +395,161 @@ def reserve_direct():
 @student_bp.route('/status', methods=['GET'])
 @jwt_required()
 def get_application_status():
-    """获取申请状态"""
+    """获取申请状态，支持 limit/cursor 分页和 stream=1 流式输出"""
     student_id = get_jwt_identity()
     
-    # 获取所有申请
-    applications = db.session.query(Application, TimeSlot, Court).join(
+    try:
+        limit, cursor, stream = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 获取所有申请，场地信息取自场地注册表
+    query = db.session.query(Application, TimeSlot).join(
         TimeSlot, Application.time_slot_id == TimeSlot.id
-    ).join(
-        Court, TimeSlot.court_id == Court.id
     ).filter(
         Application.student_id == student_id
-    ).order_by(Application.applied_at.desc()).all()
-    
-    result = []
-    for app, slot, court in applications:
-        result.append({
-            'id': app.id,
-            'application_id': app.id,
-            'timeslot_id': app.time_slot_id,
-            'status': app.status.value,
-            'court_id': court.id,
-            'court_name': court.name,
-            'court_location': court.location,
-            'date': slot.date.isoformat(),
-            'start_time': slot.start_time.strftime('%H:%M'),
-            'end_time': slot.end_time.strftime('%H:%M'),
-            'applied_at': app.applied_at.isoformat(),
-            'processed_at': app.processed_at.isoformat() if app.processed_at else None,
-            'priority_weight': app.priority_weight,
-            'queue_position': app.queue_position
-        })
-    
-    return jsonify({'applications': result}), 200
+    )
+    
+    if stream:
+        return stream_json('applications', query.order_by(*[c.desc() for c in APPLICATION_ORDER]), serialize_application)
+    
+    if limit is None:
+        applications = query.order_by(*[c.desc() for c in APPLICATION_ORDER]).all()
+        return jsonify({'applications': [serialize_application(row) for row in applications]}), 200
+    
+    try:
+        applications, next_cursor = paginate(
+            query, APPLICATION_ORDER, lambda row: (row[0].applied_at, row[0].id),
+            limit, cursor, descending=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'applications': [serialize_application(row) for row in applications],
+        'next_cursor': next_cursor
+    }), 200
+
+# 申请列表按提交时间倒序，同时用于键集分页
+APPLICATION_ORDER = (Application.applied_at, Application.id)
+
+def serialize_application(row):
+    """申请列表中的一项"""
+    app, slot = row
+    # 其他进程新建的场地可能尚未加载，查不到时场地信息为空
+    court = court_registry.get(slot.court_id) or {}
+    return {
+        'id': app.id,
+        'application_id': app.id,
+        'timeslot_id': app.time_slot_id,
+        'status': app.status.value,
+        'court_id': slot.court_id,
+        'court_name': court.get('name'),
+        'court_location': court.get('location'),
+        'date': slot.date.isoformat(),
+        'start_time': slot.start_time.strftime('%H:%M'),
+        'end_time': slot.end_time.strftime('%H:%M'),
+        'applied_at': app.applied_at.isoformat(),
+        'processed_at': app.processed_at.isoformat() if app.processed_at else None,
+        'priority_weight': app.priority_weight,
+        'queue_position': app.queue_position
+    }
 
 @student_bp.route('/records', methods=['GET'])
 @jwt_required()
 def get_reservation_records():
-    """查看历史预约与违约记录"""
+    """查看历史预约与违约记录，支持 limit/cursor 分页和 stream=1 流式输出"""
     student_id = get_jwt_identity()
     
-    # 获取所有预约记录
-    reservations = db.session.query(Reservation, TimeSlot, Court).join(
+    try:
+        limit, cursor, stream = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 获取所有预约记录，场地信息取自场地注册表
+    query = db.session.query(Reservation, TimeSlot).join(
         TimeSlot, Reservation.time_slot_id == TimeSlot.id
-    ).join(
-        Court, TimeSlot.court_id == Court.id
     ).filter(
         Reservation.student_id == student_id
-    ).order_by(Reservation.created_at.desc()).all()
-    
-    result = []
-    for res, slot, court in reservations:
-        # 确定预约状态
-        if res.is_cancelled:
-            status = 'cancelled'
-        elif res.no_show:
-            status = 'no_show'
-        elif res.is_completed:
-            status = 'completed'
-        else:
-            status = 'confirmed'
-            
-        result.append({
-            'id': res.id,
-            'reservation_id': res.id,
-            'timeslot_id': res.time_slot_id,
-            'court_id': court.id,
-            'court_name': court.name,
-            'court_location': court.location,
-            'date': slot.date.isoformat(),
-            'start_time': slot.start_time.strftime('%H:%M'),
-            'end_time': slot.end_time.strftime('%H:%M'),
-            'status': status,
-            'is_confirmed': res.is_confirmed,
-            'is_cancelled': res.is_cancelled,
-            'is_completed': res.is_completed,
-            'no_show': res.no_show,
-            'created_at': res.created_at.isoformat(),
-            'cancelled_at': res.cancelled_at.isoformat() if res.cancelled_at else None,
-            'rating': res.rating,
-            'feedback': res.feedback
-        })
-    
-    # 获取学生统计信息
+    )
+    
+    if stream:
+        return stream_json(
+            'records', query.order_by(*[c.desc() for c in RESERVATION_ORDER]), serialize_reservation,
+            extra=lambda: {'stats': student_stats(student_id)}
+        )
+    
+    next_cursor = None
+    if limit is None:
+        reservations = query.order_by(*[c.desc() for c in RESERVATION_ORDER]).all()
+    else:
+        try:
+            reservations, next_cursor = paginate(
+                query, RESERVATION_ORDER, lambda row: (row[0].created_at, row[0].id),
+                limit, cursor, descending=True
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    result = {
+        'records': [serialize_reservation(row) for row in reservations],
+        'stats': student_stats(student_id)
+    }
+    if limit is not None:
+        result['next_cursor'] = next_cursor
+    
+    return jsonify(result), 200
+
+# 预约记录按创建时间倒序，同时用于键集分页
+RESERVATION_ORDER = (Reservation.created_at, Reservation.id)
+
+def serialize_reservation(row):
+    """预约记录列表中的一项"""
+    res, slot = row
+    # 其他进程新建的场地可能尚未加载，查不到时场地信息为空
+    court = court_registry.get(slot.court_id) or {}
+    
+    # 确定预约状态
+    if res.is_cancelled:
+        status = 'cancelled'
+    elif res.no_show:
+        status = 'no_show'
+    elif res.is_completed:
+        status = 'completed'
+    else:
+        status = 'confirmed'
+    
+    return {
+        'id': res.id,
+        'reservation_id': res.id,
+        'timeslot_id': res.time_slot_id,
+        'court_id': slot.court_id,
+        'court_name': court.get('name'),
+        'court_location': court.get('location'),
+        'date': slot.date.isoformat(),
+        'start_time': slot.start_time.strftime('%H:%M'),
+        'end_time': slot.end_time.strftime('%H:%M'),
+        'status': status,
+        'is_confirmed': res.is_confirmed,
+        'is_cancelled': res.is_cancelled,
+        'is_completed': res.is_completed,
+        'no_show': res.no_show,
+        'created_at': res.created_at.isoformat(),
+        'cancelled_at': res.cancelled_at.isoformat() if res.cancelled_at else None,
+        'rating': res.rating,
+        'feedback': res.feedback
+    }
+
+def student_stats(student_id):
+    """学生统计信息"""
     student = Student.query.get(student_id)
-    stats = {
+    return {
         'credit_score': student.credit_score,
         'total_applications': student.total_applications,
         'successful_applications': student.successful_applications,
         'no_show_count': student.no_show_count,
         'success_rate': student.get_success_rate()
     }
-    
-    return jsonify({
-        'records': result,
-        'stats': stats
-    }), 200
 
 @student_bp.route('/credit', methods=['GET'])
 @jwt_required()
@@ -365,11 +561,82 @@ def get_credit_score():
     if not student:
         return jsonify({'error': '学生不存在'}), 404
     
-    return jsonify({
+    return jsonify(credit_info(student)), 200
+
+def credit_info(student):
+    """信用评分与申请统计"""
+    return {
         'credit_score': student.credit_score,
         'total_applications': student.total_applications,
         'successful_applications': student.successful_applications,
         'no_show_count': student.no_show_count,
         'success_rate': student.get_success_rate(),
-        'priority_weight': student.get_priority_weight()
-    }), 200 
\ No newline at end of file
+        'priority_weight': student.priority_weight
+    }
+
+# 学生主页可选择的数据块
+DASHBOARD_SECTIONS = ('credit', 'active_applications', 'upcoming_reservations', 'recent_history')
+
+@student_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """
+    学生主页：一次返回信用统计、进行中的申请、即将到来的预约和最近的预约记录，每个数据块一条查询。
+    fields 参数（逗号分隔）只返回指定的数据块；history_limit 指定最近预约记录的条数
+    """
+    student_id = get_jwt_identity()
+    
+    fields = request.args.get('fields')
+    sections = [f.strip() for f in fields.split(',') if f.strip()] if fields else DASHBOARD_SECTIONS
+    unknown = [f for f in sections if f not in DASHBOARD_SECTIONS]
+    if unknown:
+        return jsonify({'error': f"未知的数据块: {', '.join(unknown)}，可选: {', '.join(DASHBOARD_SECTIONS)}"}), 400
+    
+    try:
+        history_limit = int(request.args.get('history_limit', 5))
+    except ValueError:
+        return jsonify({'error': 'history_limit必须是数字'}), 400
+    history_limit = max(1, min(history_limit, current_app.config['PAGE_SIZE_MAX']))
+    
+    today = date.today()
+    result = {}
+    
+    if 'credit' in sections:
+        student = Student.query.get(student_id)
+        if not student:
+            return jsonify({'error': '学生不存在'}), 404
+        result['credit'] = credit_info(student)
+    
+    if 'active_applications' in sections:
+        # 待分配的申请，以及未来场次中仍在候补队列中的申请
+        applications = db.session.query(Application, TimeSlot).join(
+            TimeSlot, Application.time_slot_id == TimeSlot.id
+        ).filter(
+            Application.student_id == student_id,
+            TimeSlot.date >= today,
+            or_(
+                Application.status == ApplicationStatus.PENDING,
+                and_(Application.status == ApplicationStatus.REJECTED, Application.queue_position.isnot(None))
+            )
+        ).order_by(TimeSlot.date, TimeSlot.start_time).all()
+        result['active_applications'] = [serialize_application(row) for row in applications]
+    
+    if 'upcoming_reservations' in sections:
+        reservations = db.session.query(Reservation, TimeSlot).join(
+            TimeSlot, Reservation.time_slot_id == TimeSlot.id
+        ).filter(
+            Reservation.student_id == student_id,
+            Reservation.is_cancelled == False,
+            TimeSlot.date >= today
+        ).order_by(TimeSlot.date, TimeSlot.start_time).all()
+        result['upcoming_reservations'] = [serialize_reservation(row) for row in reservations]
+    
+    if 'recent_history' in sections:
+        reservations = db.session.query(Reservation, TimeSlot).join(
+            TimeSlot, Reservation.time_slot_id == TimeSlot.id
+        ).filter(
+            Reservation.student_id == student_id
+        ).order_by(*[c.desc() for c in RESERVATION_ORDER]).limit(history_limit).all()
+        result['recent_history'] = [serialize_reservation(row) for row in reservations]
+    
+    return jsonify(result), 200
@@ -14,7 +14,7 @@ def check_dependencies():
     
     required_packages = [
         'flask', 'flask_sqlalchemy', 'flask_cors', 
-        'flask_jwt_extended', 'apscheduler', 'bcrypt'
+        'flask_jwt_extended', 'apscheduler', 'bcrypt', 'numpy'
     ]
     
     missing_packages = []
@@ -70,14 +70,14 @@ def init_database():
         create_sample_timeslots()
 
 def create_sample_timeslots():
-    """创建示例时间段"""
-    from models import db, Court, TimeSlot
+    """按每周固定的示例场次模板创建可预约范围内的时间段，更远的日期由查询接口按模板展开"""
+    from models import db, Court, SlotTemplate
+    from schedules import materialize_window
     
     courts = Court.query.all()
     if not courts:
         return
     
-    # 为未来7天创建时间段
     start_date = date.today() + timedelta(days=1)
     
     time_slots = [
@@ -91,34 +91,21 @@ def create_sample_timeslots():
         (time(20, 0), time(21, 0)), # 20:00-21:00
     ]
     
-    created_count = 0
-    
-    for day_offset in range(7):  # 未来7天
-        current_date = start_date + timedelta(days=day_offset)
-        
-        for court in courts:
-            for start_time, end_time in time_slots:
-                # 检查是否已存在
-                existing = TimeSlot.query.filter_by(
-                    court_id=court.id,
-                    date=current_date,
-                    start_time=start_time,
-                    end_time=end_time
-                ).first()
-                
-                if not existing:
-                    new_slot = TimeSlot(
-                        court_id=court.id,
-                        date=current_date,
-                        start_time=start_time,
-                        end_time=end_time
-                    )
-                    db.session.add(new_slot)
-                    created_count += 1
-    
-    if created_count > 0:
-        db.session.commit()
-        print(f"✓ 已创建 {created_count} 个示例时间段")
+    # 每个场地每天相同的场次，长期有效
+    if not SlotTemplate.query.first():
+        db.session.add_all([
+            SlotTemplate(court_id=court.id, weekday=weekday, start_time=start_time,
+                         end_time=end_time, start_date=start_date)
+            for court in courts for weekday in range(7) for start_time, end_time in time_slots
+        ])
+        db.session.flush()
+    
+    # 未来 ADVANCE_DAYS 天，已存在的时间段跳过
+    created = materialize_window()
+    
+    db.session.commit()
+    if created:
+        print(f"✓ 已创建 {len(created)} 个示例时间段")
     else:
         print("✓ 时间段数据已存在")
 
@@ -0,0 +1,171 @@
+"""
+场次模板展开
+场次模板（SlotTemplate）按场地设置每周固定的场次：星期几、开始和结束时间、生效日期范围以及例外日期。
+按日期范围展开为时间段后以一条 INSERT ... ON CONFLICT DO NOTHING 写入，
+(court_id, date, start_time, end_time) 唯一，已存在的时间段直接跳过，重复展开同一范围不会产生重复数据。
+
+时间段按需写入：未来 SCHEDULE_HORIZON_DAYS 天内模板产生、但尚未写入数据库的场次作为虚拟时间段由查询接口即时展开，
+ID为 "t<模板ID>-<YYYYMMDD>" 形式的字符串；学生申请或直接预约虚拟时间段时才写入对应的时间段，
+此外调度任务每天只为未来 ADVANCE_DAYS 天写入时间段，供夜间分配和看板使用
+"""
+
+import re
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import select, tuple_
+from models import db, TimeSlot, SlotTemplate, dialect_insert
+from changes import slots_changed
+import court_registry
+import template_registry
+from template_registry import occurs_on, virtual_id
+
+# 虚拟时间段，字段与 TimeSlot 对应，便于与数据库中的时间段一起排序和序列化
+VirtualSlot = namedtuple('VirtualSlot', 'id court_id date start_time end_time is_available created_at')
+
+VIRTUAL_ID = re.compile(r'^t(\d+)-(\d{8})$')
+
+
+def occurrences(templates, start_date, end_date):
+    """模板在 [start_date, end_date] 内的所有场次，逐个产生 (场地ID, 日期, 开始时间, 结束时间)"""
+    for template in templates:
+        first = max(start_date, template.start_date)
+        last = min(end_date, template.end_date) if template.end_date else end_date
+        # 对齐到范围内第一个符合星期的日期，之后每次前进一周
+        day = first + timedelta(days=(template.weekday - first.weekday()) % 7)
+        exceptions = {date.fromisoformat(d) for d in template.exception_dates or ()}
+        while day <= last:
+            if day not in exceptions:
+                yield template.court_id, day, template.start_time, template.end_time
+            day += timedelta(weeks=1)
+
+
+def active_templates(start_date, end_date, court_id=None):
+    """与日期范围有交集的启用模板"""
+    query = SlotTemplate.query.filter(
+        SlotTemplate.is_active == True,
+        SlotTemplate.start_date <= end_date,
+        db.or_(SlotTemplate.end_date.is_(None), SlotTemplate.end_date >= start_date)
+    )
+    if court_id is not None:
+        query = query.filter(SlotTemplate.court_id == court_id)
+    return query.order_by(SlotTemplate.id).all()
+
+
+def insert_slots(rows):
+    """
+    写入时间段 [(场地ID, 日期, 开始时间, 结束时间)]，已存在的跳过（不提交事务），
+    返回新建时间段的 (ID, 场地ID, 日期, 开始时间, 结束时间)。多行参数由SQLAlchemy合并为多值INSERT分批发送，冲突的行不返回
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    slots = TimeSlot.__table__
+    statement = dialect_insert(slots).on_conflict_do_nothing(
+        index_elements=[slots.c.court_id, slots.c.date, slots.c.start_time, slots.c.end_time]
+    ).returning(slots.c.id, slots.c.court_id, slots.c.date, slots.c.start_time, slots.c.end_time)
+    created = db.session.execute(statement, [
+        {'court_id': court_id, 'date': day, 'start_time': start_time, 'end_time': end_time, 'is_available': True}
+        for court_id, day, start_time, end_time in rows
+    ]).all()
+    slots_changed([slot.id for slot in created])
+    return created
+
+
+def generate_slots(start_date, end_date, court_id=None):
+    """按启用的模板生成日期范围内的时间段（不提交事务），返回新建的时间段"""
+    return insert_slots(occurrences(active_templates(start_date, end_date, court_id), start_date, end_date))
+
+
+def horizon(today=None):
+    """虚拟时间段的日期范围 (今天, 最远日期)"""
+    today = today or date.today()
+    return today, today + timedelta(days=current_app.config['SCHEDULE_HORIZON_DAYS'])
+
+
+def virtual_slots(start_date, end_date, court_id=None, existing=()):
+    """
+    日期范围内（限于虚拟时间段范围）启用场地的虚拟时间段，按日期、开始时间、场地排序；
+    existing 为已写入数据库的 (场地ID, 日期, 开始时间, 结束时间)，这些场次不再重复展开
+    """
+    first, last = horizon()
+    start_date, end_date = max(start_date, first), min(end_date, last)
+    if start_date > end_date:
+        return []
+
+    active_courts = set(court_registry.active_ids())
+    templates = [
+        t for t in template_registry.active_templates()
+        if t.court_id in active_courts and (court_id is None or t.court_id == court_id)
+    ]
+    existing = set(existing)
+    slots = [
+        VirtualSlot(virtual_id(template.id, day), court, day, start_time, end_time, True, None)
+        for template in templates
+        for court, day, start_time, end_time in occurrences([template], start_date, end_date)
+        if (court, day, start_time, end_time) not in existing
+    ]
+    slots.sort(key=lambda slot: (slot.date, slot.start_time, slot.court_id, slot.end_time))
+    return slots
+
+
+def parse_virtual_id(value):
+    """解析虚拟时间段ID，返回 (场地ID, 日期, 开始时间, 结束时间)；ID无效、模板已停用或超出范围时返回None"""
+    match = VIRTUAL_ID.match(value)
+    if not match:
+        return None
+    template = template_registry.get(int(match.group(1)))
+    court = court_registry.get(template.court_id) if template else None
+    if court is None or not court['is_active']:
+        return None
+    try:
+        day = datetime.strptime(match.group(2), '%Y%m%d').date()
+    except ValueError:
+        return None
+    first, last = horizon()
+    if not first <= day <= last or not occurs_on(template, day):
+        return None
+    return template.court_id, day, template.start_time, template.end_time
+
+
+def resolve_slot_ids(values):
+    """
+    把请求中的时间段ID转换为数据库中的时间段ID（不提交事务）：整数原样返回，
+    虚拟时间段在此写入（已被他人写入时直接取用），无效的ID对应None
+    """
+    resolved = []
+    virtual = {}
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool):
+            resolved.append(value)
+        elif isinstance(value, str) and value.isdigit():
+            resolved.append(int(value))
+        else:
+            key = parse_virtual_id(value) if isinstance(value, str) else None
+            if key is not None:
+                virtual.setdefault(key, []).append(len(resolved))
+            resolved.append(None)
+
+    if virtual:
+        insert_slots(virtual)
+        slots = TimeSlot.__table__
+        columns = (slots.c.court_id, slots.c.date, slots.c.start_time, slots.c.end_time)
+        rows = db.session.execute(
+            select(slots.c.id, *columns).where(tuple_(*columns).in_(list(virtual)))
+        )
+        for row in rows:
+            for i in virtual.get((row.court_id, row.date, row.start_time, row.end_time), ()):
+                resolved[i] = row.id
+
+    return resolved
+
+
+def resolve_slot_id(value):
+    """单个时间段ID，见 resolve_slot_ids"""
+    return resolve_slot_ids([value])[0]
+
+
+def materialize_window(today=None):
+    """为未来 ADVANCE_DAYS 天（含今天）写入模板产生的时间段（不提交事务），返回新建的时间段"""
+    today = today or date.today()
+    return generate_slots(today, today + timedelta(days=current_app.config['ADVANCE_DAYS']))
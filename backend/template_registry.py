@@ -0,0 +1,73 @@
+"""
+场次模板注册表（进程内）
+启用的场次模板加载到内存，查询接口据此即时展开尚未写入数据库的虚拟时间段，不必为此查询模板表。
+模板通过ORM新增、修改或删除并提交后自动重新加载（见 changes.py），版本号随之递增，
+时间段查询的响应缓存以版本号区分。多进程部署时各进程独立维护。
+虚拟时间段ID由模板ID和日期组成（见 virtual_id），时间段写入数据库后仍可据此对应到原来的虚拟时间段
+"""
+
+import threading
+from sqlalchemy import select
+from models import db, SlotTemplate
+
+_lock = threading.Lock()
+_templates = {}   # 模板ID -> 模板行
+_by_slot = {}     # (场地ID, 星期, 开始时间, 结束时间) -> 模板行列表
+_version = 0
+
+
+def reload(connection=None):
+    """从数据库重新加载启用的模板；在事务提交后的回调中调用时需传入独立连接"""
+    global _templates, _by_slot, _version
+    templates = SlotTemplate.__table__
+    statement = select(templates).where(templates.c.is_active == True).order_by(templates.c.id)
+    if connection is None:
+        rows = db.session.execute(statement).all()
+    else:
+        rows = connection.execute(statement).all()
+
+    by_slot = {}
+    for row in rows:
+        by_slot.setdefault((row.court_id, row.weekday, row.start_time, row.end_time), []).append(row)
+    with _lock:
+        _templates = {row.id: row for row in rows}
+        _by_slot = by_slot
+        _version += 1
+
+
+def get(template_id):
+    """按ID获取启用的模板，不存在或已停用时返回None"""
+    return _templates.get(template_id)
+
+
+def active_templates():
+    """所有启用的模板，按ID排序"""
+    return list(_templates.values())
+
+
+def occurs_on(template, day):
+    """模板在该日期是否有场次"""
+    return (
+        day.weekday() == template.weekday
+        and template.start_date <= day
+        and (template.end_date is None or day <= template.end_date)
+        and day.isoformat() not in (template.exception_dates or ())
+    )
+
+
+def virtual_id(template_id, day):
+    """虚拟时间段ID"""
+    return f"t{template_id}-{day.strftime('%Y%m%d')}"
+
+
+def virtual_id_of(court_id, day, start_time, end_time):
+    """与该场次完全相同的模板场次的虚拟时间段ID，没有对应模板时返回None"""
+    for template in _by_slot.get((court_id, day.weekday(), start_time, end_time), ()):
+        if occurs_on(template, day):
+            return virtual_id(template.id, day)
+    return None
+
+
+def version():
+    """注册表版本号，每次重新加载后递增"""
+    return _version
@@ -0,0 +1,148 @@
+"""
+候补队列处理器
+取消预约时在同一事务中写入 CancellationEvent（发件箱），提交后唤醒后台线程立即消费：
+每个事件只需常数次查询即可把时间段递补给队列中的下一位候补者，没有事件时线程不做任何查询
+"""
+
+import threading
+import logging
+from datetime import datetime
+from sqlalchemy import func
+from models import db, Application, Reservation, TimeSlot, Student, ApplicationStatus, CancellationEvent
+from priority import refresh_pending_weights
+from changes import slots_changed
+import quota
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_drain_lock = threading.Lock()
+
+
+def claim_next_event():
+    """取出最早的未处理事件并标记为已处理，多个进程同时消费时只有一个能领取成功"""
+    while True:
+        event = CancellationEvent.query.filter(
+            CancellationEvent.processed_at.is_(None)
+        ).order_by(CancellationEvent.id).first()
+        if event is None:
+            return None
+
+        claimed = CancellationEvent.query.filter(
+            CancellationEvent.id == event.id,
+            CancellationEvent.processed_at.is_(None)
+        ).update({'processed_at': datetime.utcnow()}, synchronize_session=False)
+        if claimed:
+            return event
+        db.session.rollback()
+
+
+def promote_next(time_slot_id):
+    """
+    把时间段递补给队列位置最靠前的候补者，没有候补时释放时间段，返回递补的申请。
+    递补在同一事务中占用候补者的本周配额，已达上限的候补者移出队列，继续看下一位
+    """
+    while True:
+        next_app = Application.query.filter(
+            Application.time_slot_id == time_slot_id,
+            Application.status == ApplicationStatus.REJECTED,
+            Application.queue_position.isnot(None)
+        ).order_by(Application.queue_position).first()
+
+        if next_app is None:
+            TimeSlot.query.filter_by(id=time_slot_id).update(
+                {'is_available': True}, synchronize_session=False
+            )
+            logger.info(f"时间段 {time_slot_id} 已释放")
+            return None
+
+        if quota.consume(next_app.student_id) is not None:
+            break
+        next_app.queue_position = None
+        logger.info(f"候补跳过: 申请 {next_app.id} 的学生本周预约次数已达上限")
+
+    next_app.status = ApplicationStatus.APPROVED
+    next_app.processed_at = datetime.utcnow()
+    db.session.add(Reservation(
+        student_id=next_app.student_id,
+        time_slot_id=time_slot_id,
+        application_id=next_app.id
+    ))
+    Student.query.filter_by(id=next_app.student_id).update(
+        {'successful_applications': func.coalesce(Student.successful_applications, 0) + 1},
+        synchronize_session=False
+    )
+    refresh_pending_weights([next_app.student_id])
+    logger.info(f"候补成功: 申请 {next_app.id} 获得时间段 {time_slot_id}")
+    return next_app
+
+
+def drain_events():
+    """逐个消费未处理的取消事件，每个事件单独提交，返回处理的事件数"""
+    processed = 0
+    with _drain_lock:
+        while True:
+            event = claim_next_event()
+            if event is None:
+                return processed
+
+            event_id, time_slot_id = event.id, event.time_slot_id
+            try:
+                # 时间段仍被占用时才需要递补
+                slot_taken = TimeSlot.query.filter_by(
+                    id=time_slot_id, is_available=False
+                ).count()
+                if slot_taken:
+                    promote_next(time_slot_id)
+                    slots_changed([time_slot_id])
+                db.session.commit()
+            except Exception as e:
+                # 记录失败原因后跳过该事件，避免阻塞后续事件
+                db.session.rollback()
+                logger.error(f"取消事件 {event_id} 处理失败: {str(e)}")
+                CancellationEvent.query.filter_by(id=event_id).update(
+                    {'processed_at': datetime.utcnow(), 'error': str(e)[:500]},
+                    synchronize_session=False
+                )
+                db.session.commit()
+            processed += 1
+
+
+class WaitlistWorker(threading.Thread):
+    """后台线程：收到通知后立即消费取消事件，空闲时阻塞等待"""
+
+    def __init__(self, app):
+        super().__init__(name='waitlist-worker', daemon=True)
+        self.app = app
+        self._wakeup = threading.Event()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    drain_events()
+                except Exception as e:
+                    logger.error(f"候补队列处理失败: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+def start_worker(app):
+    """启动候补队列处理线程，并处理启动前遗留的事件"""
+    global _worker
+    if _worker is None:
+        _worker = WaitlistWorker(app)
+        _worker.start()
+        _worker.notify()
+    return _worker
+
+
+def notify():
+    """取消事件提交后调用，唤醒处理线程；线程未启动时由定时任务兜底处理"""
+    if _worker is not None:
+        _worker.notify()
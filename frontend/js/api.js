@@ -103,6 +103,11 @@ class API {
         return this.get('/api/student/credit');
     }
 
+    async getStudentDashboard(fields) {
+        const query = fields ? `?fields=${encodeURIComponent(fields.join(','))}` : '';
+        return this.get(`/api/student/dashboard${query}`);
+    }
+
     async submitApplication(applicationData) {
         return this.post('/api/student/apply', applicationData);
     }
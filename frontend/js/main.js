@@ -147,14 +147,15 @@ async function loadSectionData(sectionId) {
     }
 }
 
-// 加载用户数据
+// 加载用户数据：主页只需一次请求，完整的申请和预约列表在进入“我的预约”时再加载
 async function loadUserData() {
     try {
-        await Promise.all([
-            loadApplications(),
-            loadReservations(),
-            loadProfile()
-        ]);
+        const dashboard = await api.getStudentDashboard(['credit', 'active_applications', 'upcoming_reservations']);
+        applications = dashboard.active_applications || [];
+        reservations = dashboard.upcoming_reservations || [];
+        renderApplications();
+        renderReservations();
+        renderProfile(dashboard.credit);
     } catch (error) {
         console.error('Failed to load user data:', error);
     }
@@ -427,7 +428,7 @@ function renderTimeSlots() {
                         const statusText = getTimeSlotStatusText(slot.status);
                         
                         return `
-                            <div class="timeslot-card ${statusClass}" onclick="handleTimeSlotClick(${slot.id})">
+                            <div class="timeslot-card ${statusClass}" onclick="handleTimeSlotClick(${slotIdLiteral(slot.id)})">
                                 <div class="timeslot-status status-${slot.status}">
                                     ${statusText}
                                 </div>
@@ -437,7 +438,7 @@ function renderTimeSlots() {
                                     </div>
                                 ` : ''}
                                 ${slot.status === 'available' ? `
-                                    <button class="btn btn-primary btn-full" onclick="event.stopPropagation(); applyForTimeSlot(${slot.id})">
+                                    <button class="btn btn-primary btn-full" onclick="event.stopPropagation(); applyForTimeSlot(${slotIdLiteral(slot.id)})">
                                         申请
                                     </button>
                                 ` : ''}
@@ -546,6 +547,11 @@ function getStatusText(status) {
 }
 
 // 处理时间段点击
+// 尚未写入数据库的时间段ID为 "t<模板ID>-<日期>" 形式的字符串，写入内联事件时需加引号
+function slotIdLiteral(id) {
+    return typeof id === 'string' ? `'${id}'` : id;
+}
+
 function handleTimeSlotClick(slotId) {
     const slot = timeSlots.find(s => s.id === slotId);
     if (!slot) return;
@@ -743,12 +749,8 @@ async function loadProfile() {
     if (!authManager.isLoggedIn()) return;
 
     try {
-        const [creditResponse, recordsResponse] = await Promise.all([
-            api.getStudentCredit(),
-            api.getStudentRecords()
-        ]);
-        
-        renderProfile(creditResponse, recordsResponse);
+        const dashboard = await api.getStudentDashboard(['credit']);
+        renderProfile(dashboard.credit);
     } catch (error) {
         console.error('Failed to load profile:', error);
         showError('profile-info', '加载个人信息失败');
@@ -756,7 +758,7 @@ async function loadProfile() {
 }
 
 // 渲染个人资料
-function renderProfile(creditData, recordsData) {
+function renderProfile(creditData) {
     const user = authManager.getCurrentUser();
     if (!user) return;
 
@@ -807,21 +809,21 @@ function renderProfile(creditData, recordsData) {
 
     // 统计信息
     const statsGrid = document.getElementById('stats-grid');
-    if (statsGrid && recordsData) {
-        const records = recordsData.records || [];
-        const completedCount = records.filter(r => r.status === 'completed').length;
-        const noShowCount = records.filter(r => r.status === 'no_show').length;
-        const totalCount = records.length;
-        const successRate = totalCount > 0 ? ((completedCount / totalCount) * 100).toFixed(1) : '0.0';
+    if (statsGrid && creditData) {
+        // 统计数据由服务端维护，不必为此加载全部预约记录
+        const totalCount = creditData.total_applications || 0;
+        const successCount = creditData.successful_applications || 0;
+        const noShowCount = creditData.no_show_count || 0;
+        const successRate = totalCount > 0 ? ((successCount / totalCount) * 100).toFixed(1) : '0.0';
 
         statsGrid.innerHTML = `
             <div class="stat-item">
                 <div class="stat-number">${totalCount}</div>
-                <div class="stat-label">总预约次数</div>
+                <div class="stat-label">总申请次数</div>
             </div>
             <div class="stat-item">
-                <div class="stat-number">${completedCount}</div>
-                <div class="stat-label">成功使用</div>
+                <div class="stat-number">${successCount}</div>
+                <div class="stat-label">成功预约</div>
             </div>
             <div class="stat-item">
                 <div class="stat-number">${noShowCount}</div>
@@ -829,7 +831,7 @@ function renderProfile(creditData, recordsData) {
             </div>
             <div class="stat-item">
                 <div class="stat-number">${successRate}%</div>
-                <div class="stat-label">使用率</div>
+                <div class="stat-label">成功率</div>
             </div>
         `;
     }